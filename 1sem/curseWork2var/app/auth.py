@@ -4,7 +4,7 @@ from typing import Optional, Tuple
 import bcrypt
 
 from .config import PostgresConfig
-from .db import get_connection
+from .db import connection, get_pool
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +19,10 @@ def ensure_users_table(cfg: PostgresConfig) -> None:
         created_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
     """
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql)
             conn.commit()
-    finally:
-        conn.close()
 
 
 def ensure_default_users(cfg: PostgresConfig) -> None:
@@ -35,8 +32,7 @@ def ensure_default_users(cfg: PostgresConfig) -> None:
         ("user", "user123", "user"),
     ]
 
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             for username, password, role in defaults:
                 ph = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
@@ -45,13 +41,12 @@ def ensure_default_users(cfg: PostgresConfig) -> None:
                     (username, ph, role),
                 )
         conn.commit()
-    finally:
-        conn.close()
 
 
 def authenticate(cfg: PostgresConfig, username: str, password: str) -> Tuple[bool, Optional[str]]:
+    pool = get_pool(cfg)
     try:
-        conn = get_connection(cfg)
+        conn = pool.getconn()
     except Exception as e:
         logger.error("DB connection failed during authenticate: %s", type(e).__name__)
         return False, None
@@ -76,4 +71,4 @@ def authenticate(cfg: PostgresConfig, username: str, password: str) -> Tuple[boo
                 return True, role
             return False, None
     finally:
-        conn.close()
+        pool.putconn(conn)
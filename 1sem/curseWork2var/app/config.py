@@ -12,6 +12,9 @@ class PostgresConfig:
     user: str
     password: str
     connect_timeout: int = 3
+    pool_min_size: int = 1
+    pool_max_size: int = 5
+    pool_idle_timeout: float = 300.0
 
 
 def load_config(path: Optional[str | Path] = None) -> PostgresConfig:
@@ -33,10 +36,23 @@ def load_config(path: Optional[str | Path] = None) -> PostgresConfig:
         user = section.get("user")
         password = section.get("password")
         connect_timeout = section.getint("connect_timeout", fallback=3)
+        pool_min_size = section.getint("pool_min_size", fallback=1)
+        pool_max_size = section.getint("pool_max_size", fallback=5)
+        pool_idle_timeout = section.getfloat("pool_idle_timeout", fallback=300.0)
     except Exception as e:
         raise ValueError(f"Неверный формат config.ini: {e}") from e
 
     if not all([host, port, dbname, user]):
         raise ValueError("Заполните host, port, dbname и user в секции [postgres]")
 
-    return PostgresConfig(host=host, port=port, dbname=dbname, user=user, password=password or "", connect_timeout=connect_timeout)
+    return PostgresConfig(
+        host=host,
+        port=port,
+        dbname=dbname,
+        user=user,
+        password=password or "",
+        connect_timeout=connect_timeout,
+        pool_min_size=pool_min_size,
+        pool_max_size=pool_max_size,
+        pool_idle_timeout=pool_idle_timeout,
+    )
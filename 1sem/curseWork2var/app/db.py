@@ -1,7 +1,13 @@
 import logging
-from typing import Tuple
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import astuple
+from typing import Dict, Tuple
 
 import psycopg
+from psycopg.pq import TransactionStatus
 
 from .config import PostgresConfig
 
@@ -9,6 +15,7 @@ logger = logging.getLogger(__name__)
 
 
 def get_connection(cfg: PostgresConfig):
+    """Open a new (unpooled) connection. Prefer `connection(cfg)` in repos."""
     return psycopg.connect(
         host=cfg.host,
         port=cfg.port,
@@ -19,15 +26,243 @@ def get_connection(cfg: PostgresConfig):
     )
 
 
+class ConnectionPool:
+    """Small thread-safe pool of psycopg connections for one PostgresConfig.
+
+    Idle connections are reused LIFO. A connection that sat idle longer than
+    `check_interval` seconds is pinged with `SELECT 1` on checkout, and idle
+    connections above `min_size` are closed after `idle_timeout` seconds.
+    """
+
+    def __init__(self, cfg: PostgresConfig, min_size: int = 1, max_size: int = 5, idle_timeout: float = 300.0, check_interval: float = 30.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Неверные размеры пула: min={min_size}, max={max_size}")
+        self.cfg = cfg
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._idle: deque = deque()  # (conn, last_used_monotonic)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float | None = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Пул соединений закрыт")
+                self._prune_idle_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"Нет свободных соединений в пуле (max={self.max_size})")
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return get_connection(self.cfg)
+                except Exception:
+                    self._discard()
+                    raise
+
+            if self._is_healthy(conn, last_used):
+                return conn
+            self._close_quietly(conn)
+            self._discard()
+
+    def putconn(self, conn) -> None:
+        if not conn.closed and not conn.broken:
+            status = conn.info.transaction_status
+            if status != TransactionStatus.IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._close_quietly(conn)
+        if conn.closed or conn.broken:
+            self._close_quietly(conn)
+            self._discard()
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed or conn.broken:
+            return False
+        if time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1")
+            # commit, not rollback: psycopg drops its prepared statements on rollback
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.info("Dropping stale pooled connection: %s", type(e).__name__)
+            return False
+
+    def _prune_idle_locked(self) -> None:
+        # oldest connections sit at the left end of the deque
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(conn)
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(cfg: PostgresConfig) -> ConnectionPool:
+    """Return the process-wide pool for `cfg`, creating it on first use."""
+    key = astuple(cfg)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                cfg,
+                min_size=cfg.pool_min_size,
+                max_size=cfg.pool_max_size,
+                idle_timeout=cfg.pool_idle_timeout,
+            )
+            _pools[key] = pool
+        return pool
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class CancelScope:
+    """Tracks connections borrowed by one worker thread so they can be cancelled.
+
+    Activate it in the worker with `with scope.active():`; `cancel()` may be
+    called from any thread and sends a cancel request for the running query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = set()
+        self.cancelled = False
+
+    @contextmanager
+    def active(self):
+        prev = getattr(_local, 'scope', None)
+        _local.scope = self
+        try:
+            yield self
+        finally:
+            _local.scope = prev
+
+    def cancel(self) -> None:
+        # hold the lock so a connection cannot go back to the pool mid-cancel
+        with self._lock:
+            self.cancelled = True
+            for conn in self._conns:
+                try:
+                    # cancel_safe() appeared in psycopg 3.2
+                    getattr(conn, 'cancel_safe', conn.cancel)()
+                except Exception as e:
+                    logger.info("Query cancel failed: %s", type(e).__name__)
+
+    def _attach(self, conn) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled()
+            self._conns.add(conn)
+
+    def _detach(self, conn) -> None:
+        with self._lock:
+            self._conns.discard(conn)
+
+
+_local = threading.local()
+
+
+def check_cancelled() -> None:
+    """Raise QueryCancelled if the current worker's CancelScope was cancelled."""
+    scope = getattr(_local, 'scope', None)
+    if scope is not None and scope.cancelled:
+        raise QueryCancelled()
+
+
+@contextmanager
+def connection(cfg: PostgresConfig):
+    """Borrow a pooled connection for a `with` block.
+
+    Like `with psycopg.connect(...) as conn`: the transaction is committed
+    when the block ends normally and rolled back (on return to the pool) on
+    an exception. Committing also keeps psycopg's prepared statements, which
+    it drops on every rollback.
+    """
+    scope = getattr(_local, 'scope', None)
+    with get_pool(cfg).connection() as conn:
+        if scope is not None:
+            scope._attach(conn)
+        try:
+            yield conn
+            if not conn.closed and not conn.broken and conn.info.transaction_status != TransactionStatus.IDLE:
+                conn.commit()
+        finally:
+            if scope is not None:
+                scope._detach(conn)
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
 def healthcheck(cfg: PostgresConfig) -> Tuple[bool, str]:
     try:
-        conn = get_connection(cfg)
-        try:
+        with connection(cfg) as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1;")
                 _ = cur.fetchone()
-        finally:
-            conn.close()
         return True, "OK"
     except Exception as e:
         logger.error("DB connection failed to %s:%s/%s: %s", cfg.host, cfg.port, cfg.dbname, str(e))
@@ -0,0 +1,51 @@
+"""Command-line bulk import: python -m app.import_cli {clients,books} FILE.csv"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from .config import load_config
+from .db import close_all_pools
+from .repos import bulk_import
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger("app.import")
+
+    parser = argparse.ArgumentParser(description="Массовый импорт клиентов/книг из CSV (UTF-8, строка заголовка с именами столбцов)")
+    parser.add_argument("table", choices=bulk_import.IMPORT_TABLES)
+    parser.add_argument("file")
+    parser.add_argument("--rejects", help="файл для отклонённых строк (по умолчанию <file>.rejects.csv)")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--config", default="config.ini")
+    args = parser.parse_args(argv)
+
+    try:
+        cfg = load_config(str(Path(args.config)))
+    except Exception as e:
+        logger.error("Ошибка чтения %s: %s", args.config, e)
+        return 2
+
+    def progress(sent, total):
+        if total:
+            print(f"\rЗагрузка: {sent * 100 // total}%", end="", file=sys.stderr, flush=True)
+
+    try:
+        result = bulk_import.import_csv(cfg, args.table, args.file, args.rejects, args.delimiter, progress)
+    except Exception as e:
+        print(file=sys.stderr)
+        logger.error("Импорт не выполнен: %s: %s", type(e).__name__, e)
+        return 1
+    finally:
+        close_all_pools()
+    print(file=sys.stderr)
+
+    logger.info("Строк в файле: %s, добавлено: %s, отклонено: %s", result.total, result.inserted, result.rejected)
+    if result.rejects_path:
+        logger.info("Отклонённые строки: %s", result.rejects_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
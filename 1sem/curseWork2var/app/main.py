@@ -5,9 +5,11 @@ from pathlib import Path
 from PySide6.QtWidgets import QApplication
 
 from .config import load_config
-from .db import healthcheck
+from .db import healthcheck, close_all_pools
 from .auth import ensure_users_table, ensure_default_users
+from .repos import index_advisor
 from .ui.login import LoginWindow
+from .ui.change_listener import stop_all_listeners
 
 
 def main():
@@ -32,6 +34,13 @@ def main():
     except Exception as e:
         logger.warning("Не удалось создать/инициализировать таблицу пользователей: %s", e)
 
+    # Report journal indexes the issue/report queries need (created from СЕРВИС menu)
+    try:
+        for adv in index_advisor.missing_indexes(cfg):
+            logger.warning("Нет индекса %s (%s) — создайте через СЕРВИС → Индексы журнала", adv.name, adv.reason)
+    except Exception as e:
+        logger.warning("Не удалось проверить индексы журнала: %s", e)
+
     ok, msg = healthcheck(cfg)
     if ok:
         logger.info("DB: connected to %s:%s/%s", cfg.host, cfg.port, cfg.dbname)
@@ -39,6 +48,9 @@ def main():
         logger.error("DB healthcheck failed: %s", msg)
 
     app = QApplication(sys.argv)
+    # pooled connections are process-wide; release them when the GUI exits
+    app.aboutToQuit.connect(stop_all_listeners)
+    app.aboutToQuit.connect(close_all_pools)
 
     # Show a message box if DB not found? We'll show status inside LoginWindow
     login = LoginWindow(cfg, db_ok=ok, db_msg=msg)
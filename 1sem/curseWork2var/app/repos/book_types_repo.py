@@ -1,13 +1,12 @@
 from typing import List, Dict
 
 from ..config import PostgresConfig
-from ..db import get_connection
+from ..db import connection
 
 
 def list_types(cfg: PostgresConfig) -> List[Dict]:
     sql = "SELECT * FROM public.book_types ORDER BY 1"
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql)
             rows = cur.fetchall()
@@ -17,5 +16,3 @@ def list_types(cfg: PostgresConfig) -> List[Dict]:
                 item = {cols[i]: r[i] for i in range(len(cols))}
                 result.append(item)
             return result
-    finally:
-        conn.close()
@@ -0,0 +1,281 @@
+"""Bulk CSV import for clients and books through COPY and a staging table.
+
+The file is streamed with `COPY ... FROM STDIN` into a temporary text table,
+validated with set-based queries (column types, NOT NULL, CHECK constraints
+such as `books.cnt >= 0`, the table's UNIQUE constraints such as
+`uq_clients_passport`, foreign keys such as books -> book_types) and the valid rows are merged into the real table in the same
+transaction. Rejected rows are written with the reason to a side CSV file.
+
+Records are split with `csv.reader` on the way to COPY: one with more or
+fewer fields than the header would abort the whole COPY, so it is kept out
+of it and rejected like any other row.
+"""
+import csv
+import os
+import re
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+from psycopg.sql import SQL, Identifier, Literal
+
+from ..config import PostgresConfig
+from ..db import connection
+from . import schema_cache
+
+IMPORT_TABLES = ('clients', 'books')
+
+# bytes per COPY chunk
+CHUNK_SIZE = 1 << 20
+
+_COLUMNS_SQL = """
+SELECT a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull, a.atthasdef OR a.attidentity <> ''
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relname = %s AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY a.attnum
+"""
+
+_UNIQUE_SQL = """
+SELECT con.conname, array_agg(a.attname ORDER BY k.ord)
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+CROSS JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+WHERE n.nspname = 'public' AND c.relname = %s AND con.contype = 'u'
+GROUP BY con.conname
+"""
+
+_CHECK_SQL = """
+SELECT con.conname, pg_get_expr(con.conbin, con.conrelid), array_agg(a.attname)
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = ANY(con.conkey)
+WHERE n.nspname = 'public' AND c.relname = %s AND con.contype = 'c'
+GROUP BY con.conname, con.conbin, con.conrelid
+"""
+
+# used when the server has no pg_input_is_valid (PostgreSQL < 16)
+_TYPE_PATTERNS = {
+    'smallint': r'^\s*[-+]?\d+\s*$',
+    'integer': r'^\s*[-+]?\d+\s*$',
+    'bigint': r'^\s*[-+]?\d+\s*$',
+    'numeric': r'^\s*[-+]?(\d+(\.\d*)?|\.\d+)\s*$',
+    'date': r'^\s*\d{4}-\d{2}-\d{2}\s*$',
+}
+# the cast in step 3 would silently cut longer values (also < 16 only)
+_LENGTH_TYPE = re.compile(r'^(character varying|character)\((\d+)\)$')
+
+
+@dataclass
+class ImportResult:
+    total: int
+    inserted: int
+    rejected: int
+    rejects_path: Optional[str]
+
+
+def default_rejects_path(src_path: str) -> str:
+    root, _ = os.path.splitext(src_path)
+    return root + '.rejects.csv'
+
+
+def _read_header(src_path: str, delimiter: str) -> List[str]:
+    # utf-8-sig: Excel's "CSV UTF-8" starts with a BOM
+    with open(src_path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f, delimiter=delimiter), None)
+    if not header:
+        raise ValueError(f"Файл {src_path} пуст или без заголовка")
+    return [h.strip() for h in header]
+
+
+def _records(f: BinaryIO, delimiter: str) -> Iterator[Tuple[List[str], bytes]]:
+    """(fields, raw bytes) of every record in `f`, header included.
+
+    The raw bytes are passed to COPY unchanged, so quoting (and with it
+    NULL vs. empty string) is left to the server as before.
+    """
+    raw: List[bytes] = []
+
+    def lines():
+        for line in f:
+            raw.append(line)
+            yield line.decode('utf-8')
+
+    reader = csv.reader(lines(), delimiter=delimiter)
+    try:
+        for fields in reader:
+            yield fields, b''.join(raw)
+            raw.clear()
+    except csv.Error as e:
+        raise ValueError(f"Ошибка разбора CSV в строке {reader.line_num}: {e}") from e
+
+
+def import_csv(
+    cfg: PostgresConfig,
+    table: str,
+    src_path: str,
+    rejects_path: Optional[str] = None,
+    delimiter: str = ',',
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> ImportResult:
+    """Import `src_path` (UTF-8 CSV with a header row) into `table` (clients or books).
+
+    `progress(bytes_sent, total_bytes)` is called after every COPY chunk.
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Импорт не поддерживается для таблицы {table}")
+    rejects_path = rejects_path or default_rejects_path(src_path)
+    header = _read_header(src_path, delimiter)
+    pk = schema_cache.get_pk(cfg, table)
+    fks = schema_cache.get_fk_map(cfg, table)
+    total_bytes = os.path.getsize(src_path)
+
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(_COLUMNS_SQL, (table,))
+            col_info = {name: (typ, notnull, hasdef) for name, typ, notnull, hasdef in cur.fetchall()}
+            unknown = [h for h in header if h not in col_info or h == pk]
+            if unknown:
+                raise ValueError(f"Неизвестные столбцы для {table}: {', '.join(unknown)}")
+            cur.execute(_UNIQUE_SQL, (table,))
+            uniques = [(name, cols) for name, cols in cur.fetchall() if set(cols) <= set(header)]
+            # checks on columns missing from the file see their defaults only at insert time
+            cur.execute(_CHECK_SQL, (table,))
+            checks = [(name, expr) for name, expr, cols in cur.fetchall() if set(cols) <= set(header)]
+            missing = [c for c, (_t, notnull, hasdef) in col_info.items() if notnull and not hasdef and c not in header]
+            if missing:
+                raise ValueError(f"В файле нет обязательных столбцов: {', '.join(missing)}")
+
+            cols = [Identifier(h) for h in header]
+            cols_sql = SQL(', ').join(cols)
+
+            # 1. raw text stage, filled by COPY; line_no is the record number in the file
+            cur.execute(SQL("CREATE TEMP TABLE import_raw (line_no bigint, {cols}, reject text) ON COMMIT DROP").format(
+                cols=SQL(', ').join(SQL("{} text").format(c) for c in cols)))
+            copy_sql = SQL("COPY import_raw (line_no, {cols}) FROM STDIN WITH (FORMAT csv, DELIMITER {delim})").format(
+                cols=cols_sql, delim=Literal(delimiter))
+            width = len(header)
+            prefix = delimiter.encode('utf-8')
+            malformed = []
+            line_no = 0
+            with cur.copy(copy_sql) as copy:
+                with open(src_path, 'rb') as f:
+                    records = _records(f, delimiter)
+                    sent = len(next(records)[1])  # header, see _read_header
+                    chunk: List[bytes] = []
+                    size = 0
+                    for fields, data in records:
+                        sent += len(data)
+                        if not fields:
+                            # blank line
+                            continue
+                        line_no += 1
+                        if len(fields) != width:
+                            # empty fields as NULL, like unquoted ones from COPY
+                            values = [v or None for v in fields] + [None] * width
+                            malformed.append((line_no, *values[:width],
+                                              f"неверное число полей: {len(fields)} вместо {width}"))
+                            continue
+                        chunk.append(b'%d%s%s' % (line_no, prefix, data))
+                        size += len(chunk[-1])
+                        if size >= CHUNK_SIZE:
+                            copy.write(b''.join(chunk))
+                            chunk.clear()
+                            size = 0
+                            if progress:
+                                progress(sent, total_bytes)
+                    copy.write(b''.join(chunk))
+                    if progress:
+                        progress(sent, total_bytes)
+            if malformed:
+                cur.executemany(SQL("INSERT INTO import_raw (line_no, {cols}, reject) VALUES ({values})").format(
+                    cols=cols_sql, values=SQL(', ').join([SQL('%s')] * (width + 2))), malformed)
+
+            # 2. per-value checks on the text stage
+            has_input_check = conn.info.server_version >= 160000
+            for h, c in zip(header, cols):
+                typ, notnull, _hasdef = col_info[h]
+                if notnull:
+                    cur.execute(SQL("UPDATE import_raw SET reject = {msg} WHERE reject IS NULL AND {c} IS NULL").format(
+                        msg=Literal(f"пустое значение {h}"), c=c))
+                if has_input_check:
+                    check = SQL("NOT pg_input_is_valid({c}, {typ})").format(c=c, typ=Literal(typ))
+                elif typ.split('(')[0] in _TYPE_PATTERNS:
+                    check = SQL("{c} !~ {pattern}").format(c=c, pattern=Literal(_TYPE_PATTERNS[typ.split('(')[0]]))
+                elif m := _LENGTH_TYPE.match(typ):
+                    # trailing spaces beyond the length are dropped, as on insert
+                    check = SQL("length(rtrim({c}, ' ')) > {n}").format(c=c, n=Literal(int(m.group(2))))
+                else:
+                    continue
+                cur.execute(SQL("UPDATE import_raw SET reject = {msg} WHERE reject IS NULL AND {c} IS NOT NULL AND {check}").format(
+                    msg=Literal(f"неверное значение {h} ({typ})"), c=c, check=check))
+
+            # 3. typed stage: casts only run on rows that passed step 2
+            cur.execute(SQL("CREATE TEMP TABLE import_typed ON COMMIT DROP AS SELECT line_no, {casts}, NULL::text AS reject FROM import_raw WHERE reject IS NULL").format(
+                casts=SQL(', ').join(SQL("{c}::{typ} AS {c}").format(c=c, typ=SQL(col_info[h][0])) for h, c in zip(header, cols))))
+
+            for name, expr in checks:
+                # like the constraint itself, a NULL result passes
+                cur.execute(SQL("UPDATE import_typed SET reject = {msg} WHERE reject IS NULL AND NOT ({expr})").format(
+                    msg=Literal(f"нарушено условие {name}"), expr=SQL(expr)))
+
+            # checks against the real table from here on: keep concurrent writers out until commit
+            cur.execute(SQL("LOCK TABLE public.{} IN SHARE ROW EXCLUSIVE MODE").format(Identifier(table)))
+            for name, ucols in uniques:
+                cur.execute(SQL("""
+                    UPDATE import_typed s SET reject = {msg}
+                    WHERE reject IS NULL AND EXISTS (SELECT 1 FROM public.{tbl} t WHERE {match})
+                """).format(msg=Literal(f"уже есть в базе ({name})"), tbl=Identifier(table),
+                            match=SQL(' AND ').join(SQL("t.{k} = s.{k}").format(k=Identifier(u)) for u in ucols)))
+
+            for col, ref in fks.items():
+                if col not in header:
+                    continue
+                cur.execute(SQL("""
+                    UPDATE import_typed s SET reject = {msg}
+                    WHERE reject IS NULL AND s.{c} IS NOT NULL
+                      AND NOT EXISTS (SELECT 1 FROM public.{rt} r WHERE r.{rc} = s.{c})
+                """).format(msg=Literal(f"нет записи в {ref['referenced_table']} для {col}"), c=Identifier(col),
+                            rt=Identifier(ref['referenced_table']), rc=Identifier(ref['referenced_column'])))
+
+            # in-file duplicates last, among rows that would otherwise be inserted:
+            # the first valid occurrence in the file wins
+            for name, ucols in uniques:
+                keys = [Identifier(u) for u in ucols]
+                not_null = SQL(' AND ').join(SQL("{} IS NOT NULL").format(k) for k in keys)
+                cur.execute(SQL("""
+                    UPDATE import_typed s SET reject = {msg}
+                    FROM (SELECT line_no, row_number() OVER (PARTITION BY {keys} ORDER BY line_no) AS rn
+                          FROM import_typed WHERE reject IS NULL AND {not_null}) d
+                    WHERE d.line_no = s.line_no AND d.rn > 1
+                """).format(msg=Literal(f"повтор в файле ({name})"), keys=SQL(', ').join(keys), not_null=not_null))
+
+            # 4. merge
+            cur.execute(SQL("INSERT INTO public.{tbl} ({cols}) SELECT {cols} FROM import_typed WHERE reject IS NULL ORDER BY line_no").format(
+                tbl=Identifier(table), cols=cols_sql))
+            inserted = cur.rowcount
+
+            cur.execute("SELECT count(*) FROM import_raw")
+            total = cur.fetchone()[0]
+            rejected = total - inserted
+
+            # 5. rejects side file, streamed with COPY TO STDOUT
+            if rejected:
+                rejects_sql = SQL("""
+                    COPY (
+                        SELECT r.line_no, COALESCE(r.reject, t.reject) AS reason, {raw_cols}
+                        FROM import_raw r LEFT JOIN import_typed t ON t.line_no = r.line_no
+                        WHERE r.reject IS NOT NULL OR t.reject IS NOT NULL
+                        ORDER BY r.line_no
+                    ) TO STDOUT WITH (FORMAT csv, HEADER true, DELIMITER {delim})
+                """).format(raw_cols=SQL(', ').join(SQL("r.{}").format(c) for c in cols), delim=Literal(delimiter))
+                with open(rejects_path, 'wb') as out:
+                    with cur.copy(rejects_sql) as copy:
+                        for data in copy:
+                            out.write(data)
+        conn.commit()
+
+    return ImportResult(total=total, inserted=inserted, rejected=rejected, rejects_path=rejects_path if rejected else None)
@@ -0,0 +1,147 @@
+"""Change notifications for the journal, books and clients tables.
+
+Statement-level triggers send one `pg_notify` per modifying statement on
+`CHANNEL` with a JSON payload `{"table": ..., "op": ..., "ids": [...]}`, the
+primary keys of the affected rows. When a statement touches more than
+`MAX_IDS` rows (or on TRUNCATE) `ids` is null and listeners reload the table
+instead. Notifications are delivered on commit, so a listener never sees
+uncommitted rows. See `ui.change_listener` for the receiving side.
+
+Installing/removing is an admin action, like the report summary.
+"""
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from psycopg.sql import SQL, Identifier, Literal
+
+from ..config import PostgresConfig
+from ..db import connection
+from . import journal_repo, schema_cache
+
+CHANNEL = 'library_changes'
+# keeps the payload well below the 8000 byte NOTIFY limit
+MAX_IDS = 200
+
+_FUNCTION = 'library_change_notify'
+_TRIGGER_PREFIX = 'trg_library_notify_'
+
+_FUNCTION_SQL = SQL("""
+CREATE OR REPLACE FUNCTION public.{fn}() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    -- TG_ARGV[0]: primary key column of the table
+    n bigint;
+    ids jsonb;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify({channel}, json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', NULL)::text);
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        SELECT count(*), jsonb_agg(to_jsonb(r) -> TG_ARGV[0]) INTO n, ids FROM (SELECT * FROM old_rows LIMIT {limit}) r;
+    ELSE
+        SELECT count(*), jsonb_agg(to_jsonb(r) -> TG_ARGV[0]) INTO n, ids FROM (SELECT * FROM new_rows LIMIT {limit}) r;
+    END IF;
+    IF n = 0 THEN
+        RETURN NULL;
+    END IF;
+    IF n >= {limit} THEN
+        ids := NULL;
+    END IF;
+    PERFORM pg_notify({channel}, json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', ids)::text);
+    IF TG_OP = 'UPDATE' THEN
+        -- rows whose primary key was changed are gone under the old key
+        SELECT count(*), jsonb_agg(k) INTO n, ids FROM (
+            SELECT to_jsonb(o) -> TG_ARGV[0] AS k FROM old_rows o
+            EXCEPT
+            SELECT to_jsonb(w) -> TG_ARGV[0] FROM new_rows w
+            LIMIT {limit}) d;
+        IF n > 0 THEN
+            PERFORM pg_notify({channel}, json_build_object('table', TG_TABLE_NAME, 'op', 'DELETE',
+                                                            'ids', CASE WHEN n < {limit} THEN ids END)::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$
+""")
+
+# (event, REFERENCING clause)
+_EVENTS = (
+    ('INSERT', "REFERENCING NEW TABLE AS new_rows"),
+    ('UPDATE', "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ('DELETE', "REFERENCING OLD TABLE AS old_rows"),
+    ('TRUNCATE', ""),
+)
+
+
+@dataclass
+class Change:
+    table: str
+    op: str
+    # None: too many rows (or TRUNCATE), reload the whole table
+    ids: Optional[list]
+
+
+def parse_payload(payload: str) -> Change:
+    data = json.loads(payload)
+    return Change(table=data['table'], op=data['op'], ids=data.get('ids'))
+
+
+def watched_tables(cfg: PostgresConfig) -> List[str]:
+    tables = [journal_repo.detect_journal_table(cfg), 'books', 'clients']
+    return [t for t in tables if schema_cache.table_exists(cfg, t)]
+
+
+def _trigger_name(event: str) -> str:
+    return _TRIGGER_PREFIX + event.lower()
+
+
+def is_installed(cfg: PostgresConfig) -> bool:
+    """True if the journal has the notify triggers."""
+    table = journal_repo.detect_journal_table(cfg)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid"
+                " JOIN pg_namespace n ON n.oid = c.relnamespace"
+                " WHERE n.nspname = 'public' AND c.relname = %s AND t.tgname LIKE %s",
+                (table, _TRIGGER_PREFIX + '%'),
+            )
+            return cur.fetchone() is not None
+
+
+def install(cfg: PostgresConfig) -> List[str]:
+    """Create (or re-create) the notify function and triggers; returns the watched tables."""
+    tables = watched_tables(cfg)
+    for t in tables:
+        if not schema_cache.get_pk(cfg, t):
+            raise ValueError(f"Table '{t}' has no primary key")
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(_FUNCTION_SQL.format(fn=Identifier(_FUNCTION), channel=Literal(CHANNEL), limit=Literal(MAX_IDS + 1)))
+            for t in tables:
+                pk = schema_cache.get_pk(cfg, t)
+                for event, referencing in _EVENTS:
+                    trg = Identifier(_trigger_name(event))
+                    cur.execute(SQL("DROP TRIGGER IF EXISTS {trg} ON public.{tbl}").format(trg=trg, tbl=Identifier(t)))
+                    cur.execute(SQL("CREATE TRIGGER {trg} AFTER " + event + " ON public.{tbl} " + referencing +
+                                    " FOR EACH STATEMENT EXECUTE FUNCTION public.{fn}({pk})").format(
+                        trg=trg, tbl=Identifier(t), fn=Identifier(_FUNCTION), pk=Literal(pk)))
+        conn.commit()
+    schema_cache.invalidate(cfg)
+    return tables
+
+
+def uninstall(cfg: PostgresConfig) -> None:
+    """Drop the notify triggers and function; open views fall back to manual refresh."""
+    tables = watched_tables(cfg)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            for t in tables:
+                for event, _ in _EVENTS:
+                    cur.execute(SQL("DROP TRIGGER IF EXISTS {trg} ON public.{tbl}").format(
+                        trg=Identifier(_trigger_name(event)), tbl=Identifier(t)))
+            cur.execute(SQL("DROP FUNCTION IF EXISTS public.{}()").format(Identifier(_FUNCTION)))
+        conn.commit()
+    schema_cache.invalidate(cfg)
@@ -3,65 +3,57 @@ from typing import List, Tuple, Optional, Dict
 from psycopg.sql import SQL, Identifier
 
 from ..config import PostgresConfig
-from ..db import get_connection
+from ..db import connection
+from . import paging, schema_cache, text_search
 
 
 def get_columns(cfg: PostgresConfig) -> List[Dict]:
-    sql = """
-    SELECT column_name, data_type, is_nullable
-    FROM information_schema.columns
-    WHERE table_schema='public' AND table_name='clients'
-    ORDER BY ordinal_position
-    """
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            return [
-                {"column_name": r[0], "data_type": r[1], "is_nullable": r[2]}
-                for r in rows
-            ]
-    finally:
-        conn.close()
+    return schema_cache.get_columns(cfg, 'clients')
 
 
 def get_pk(cfg: PostgresConfig) -> Optional[str]:
-    sql = """
-    SELECT kcu.column_name
-    FROM information_schema.table_constraints tc
-    JOIN information_schema.key_column_usage kcu
-      ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
-    WHERE tc.constraint_type = 'PRIMARY KEY'
-      AND tc.table_schema = 'public' AND tc.table_name = 'clients'
-    ORDER BY kcu.ordinal_position
-    LIMIT 1
-    """
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            row = cur.fetchone()
-            return row[0] if row else None
-    finally:
-        conn.close()
+    return schema_cache.get_pk(cfg, 'clients')
 
 
-def list_rows(cfg: PostgresConfig) -> Tuple[List[str], List[Tuple]]:
+def list_page(cfg: PostgresConfig, after=None, before=None, limit: int = paging.PAGE_SIZE,
+              query: Optional[paging.ListQuery] = None) -> Tuple[List[str], List[Tuple]]:
+    """One keyset page of clients (pk descending unless `query` sorts), see paging.keyset_page."""
     pk = get_pk(cfg)
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            if pk:
-                sql = SQL("SELECT * FROM public.clients ORDER BY {} DESC").format(Identifier(pk))
-            else:
-                sql = SQL("SELECT * FROM public.clients")
-            cur.execute(sql)
-            rows = cur.fetchall()
-            cols = [d.name for d in cur.description]
-            return cols, rows
-    finally:
-        conn.close()
+    pk_expr = Identifier(pk) if pk else None
+    return paging.keyset_page(cfg, SQL("SELECT * FROM public.clients"), pk_expr, after, before, limit, query=query, pk_col=pk)
+
+
+def _search_select(cfg: PostgresConfig):
+    name_cols, extra_cols = text_search.search_columns(cfg, 'clients')
+    cols = SQL(', ').join(SQL("t.{}").format(Identifier(c)) for c in [get_pk(cfg)] + name_cols + extra_cols)
+    return cols, len(name_cols)
+
+
+def _search_hits(rows: List[Tuple], n_names: int) -> List[Dict]:
+    hits = []
+    for r in rows:
+        label = ' '.join(str(v) for v in r[1:1 + n_names] if v)
+        passport = ' '.join(str(v) for v in r[1 + n_names:] if v)
+        if passport:
+            label = f"{label}, {passport}" if label else passport
+        hits.append({'id': r[0], 'label': label})
+    return hits
+
+
+def search(cfg: PostgresConfig, text: str, limit: int = text_search.SEARCH_LIMIT) -> List[Dict]:
+    """Clients whose name or passport contains every word of `text` as {'id', 'label'}, best first."""
+    if not get_pk(cfg):
+        return []
+    cols, n_names = _search_select(cfg)
+    return _search_hits(text_search.search(cfg, 'clients', cols, text, limit), n_names)
+
+
+def lookup(cfg: PostgresConfig, ids: List) -> List[Dict]:
+    """Search hits for known client ids (e.g. the client of an open loan)."""
+    if not get_pk(cfg):
+        return []
+    cols, n_names = _search_select(cfg)
+    return _search_hits(text_search.by_ids(cfg, 'clients', cols, ids), n_names)
 
 
 def insert_row(cfg: PostgresConfig, data: Dict, pk_col: Optional[str]) -> None:
@@ -74,13 +66,10 @@ def insert_row(cfg: PostgresConfig, data: Dict, pk_col: Optional[str]) -> None:
     cols_ident = SQL(', ').join(Identifier(c) for c in cols)
     placeholders = SQL(', ').join(SQL('%s') for _ in cols)
     sql = SQL("INSERT INTO public.clients ({}) VALUES ({})").format(cols_ident, placeholders)
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, tuple(vals))
         conn.commit()
-    finally:
-        conn.close()
 
 
 def update_row(cfg: PostgresConfig, pk_col: str, pk_value, data: Dict) -> None:
@@ -90,21 +79,15 @@ def update_row(cfg: PostgresConfig, pk_col: str, pk_value, data: Dict) -> None:
     set_clause = SQL(', ').join(SQL("{} = %s").format(Identifier(c)) for c in cols)
     vals = [data[c] for c in cols]
     sql = SQL("UPDATE public.clients SET {} WHERE {} = %s").format(set_clause, Identifier(pk_col))
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, tuple(vals) + (pk_value,))
         conn.commit()
-    finally:
-        conn.close()
 
 
 def delete_row(cfg: PostgresConfig, pk_col: str, pk_value) -> None:
     sql = SQL("DELETE FROM public.clients WHERE {} = %s").format(Identifier(pk_col))
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (pk_value,))
         conn.commit()
-    finally:
-        conn.close()
@@ -0,0 +1,115 @@
+"""Detects and creates the secondary indexes the journal queries rely on.
+
+The LR1 schema only has primary keys, so the open-loan lookups done on every
+issue (`is_book_available`, `count_active_loans_for_client`) and the report
+date filters scan the whole journal. `missing_indexes()` is cheap enough for a
+startup check; `create_indexes()` builds them CONCURRENTLY and is meant to be
+run by an admin.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from psycopg.sql import SQL, Composed, Identifier
+
+from ..config import PostgresConfig
+from ..db import connection
+from . import journal_repo, schema_cache
+
+# open_pred: the index predicate is exactly "<returned column> IS NULL"
+_OPEN_PRED_SQL = SQL("COALESCE(pg_get_expr(i.indpred, i.indrelid) = format('(%%I IS NULL)', %(ret)s::text), false)")
+_EXISTING_SQL = SQL("""
+SELECT a.attname, i.indpred IS NULL AS full_index, {open_pred} AS open_pred
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+WHERE n.nspname = 'public' AND c.relname = %(tbl)s AND i.indisvalid
+""")
+
+
+@dataclass
+class IndexAdvice:
+    name: str
+    column: str
+    # partial index over open loans only (WHERE <returned> IS NULL)
+    open_only_on: Optional[str]
+    method: str
+    reason: str
+
+    def create_sql(self, table: str) -> Composed:
+        sql = SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{tbl} USING {method} ({col})").format(
+            name=Identifier(self.name), tbl=Identifier(table), method=SQL(self.method), col=Identifier(self.column))
+        if self.open_only_on:
+            sql = SQL("{} WHERE {} IS NULL").format(sql, Identifier(self.open_only_on))
+        return sql
+
+
+def _journal_table(cfg: PostgresConfig) -> Optional[str]:
+    # unlike detect_journal_table this never creates the table
+    for t in ('journal', 'loans', 'issues'):
+        if schema_cache.table_exists(cfg, t):
+            return t
+    return None
+
+
+def recommended_indexes(cfg: PostgresConfig, table: str) -> List[IndexAdvice]:
+    colmap = journal_repo.get_journal_colmap(cfg, table)
+    ret = colmap.get('returned_at')
+    advices = []
+    if ret:
+        advices.append(IndexAdvice(f"{table}_{colmap['book_id']}_open_idx", colmap['book_id'], ret, 'btree',
+                                   'проверка доступности книги при выдаче'))
+        advices.append(IndexAdvice(f"{table}_{colmap['client_id']}_open_idx", colmap['client_id'], ret, 'btree',
+                                   'лимит активных выдач клиента'))
+    advices.append(IndexAdvice(f"{table}_{colmap['issued_at']}_brin", colmap['issued_at'], None, 'brin',
+                               'фильтр отчётов по дате выдачи'))
+    return advices
+
+
+def missing_indexes(cfg: PostgresConfig) -> List[IndexAdvice]:
+    """Recommended indexes that no existing valid index on the journal covers."""
+    table = _journal_table(cfg)
+    if table is None:
+        return []
+    advices = recommended_indexes(cfg, table)
+    ret = journal_repo.get_journal_colmap(cfg, table).get('returned_at')
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            # format() cannot quote a NULL identifier; without a returned column no open-loan index is advised
+            open_pred = _OPEN_PRED_SQL if ret else SQL("false")
+            cur.execute(_EXISTING_SQL.format(open_pred=open_pred), {'tbl': table, 'ret': ret})
+            existing = cur.fetchall()
+
+    def covered(adv: IndexAdvice) -> bool:
+        # a full index on the column serves the partial lookups too
+        return any(col == adv.column and (full or (adv.open_only_on and open_pred)) for col, full, open_pred in existing)
+
+    return [adv for adv in advices if not covered(adv)]
+
+
+def create_indexes(cfg: PostgresConfig, advices: List[IndexAdvice]) -> List[str]:
+    """Build the given indexes CONCURRENTLY (journal stays writable); returns created names."""
+    table = _journal_table(cfg)
+    if table is None or not advices:
+        return []
+    created = []
+    with connection(cfg) as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for adv in advices:
+                    # a failed concurrent build leaves an invalid index behind under the same name
+                    cur.execute(
+                        "SELECT 1 FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid"
+                        " JOIN pg_namespace n ON n.oid = ic.relnamespace"
+                        " WHERE n.nspname = 'public' AND ic.relname = %s AND NOT i.indisvalid",
+                        (adv.name,),
+                    )
+                    if cur.fetchone():
+                        cur.execute(SQL("DROP INDEX CONCURRENTLY IF EXISTS public.{}").format(Identifier(adv.name)))
+                    cur.execute(adv.create_sql(table))
+                    created.append(adv.name)
+        finally:
+            conn.autocommit = False
+    return created
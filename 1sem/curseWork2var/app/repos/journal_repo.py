@@ -1,61 +1,44 @@
-from typing import List, Tuple, Optional, Dict
+import threading
+from dataclasses import dataclass, astuple
+from typing import List, Tuple, Optional, Dict, Iterable
 from datetime import date
 
+import psycopg
 from psycopg.sql import SQL, Identifier
 
 from ..config import PostgresConfig
-from ..db import get_connection
+from ..db import connection
+from . import paging, schema_cache
 
 
 def detect_journal_table(cfg: PostgresConfig) -> str:
     candidates = ['journal', 'loans', 'issues']
-    conn = get_connection(cfg)
-    try:
+    for t in candidates:
+        if schema_cache.table_exists(cfg, t):
+            return t
+    # fallback: create public.journal
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
-            for t in candidates:
-                cur.execute("SELECT to_regclass(%s)", ('public.' + t,))
-                row = cur.fetchone()
-                if row and row[0]:
-                    return t
-            # fallback: create public.journal
             cur.execute(
-                "SELECT to_regclass('public.journal')"
-            )
-            if not cur.fetchone()[0]:
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS public.journal (
-                        id serial PRIMARY KEY,
-                        client_id integer,
-                        book_id integer,
-                        issued_at date NOT NULL DEFAULT CURRENT_DATE,
-                        due_at date,
-                        returned_at date,
-                        fine_amount numeric
-                    )
-                    """
+                """
+                CREATE TABLE IF NOT EXISTS public.journal (
+                    id serial PRIMARY KEY,
+                    client_id integer,
+                    book_id integer,
+                    issued_at date NOT NULL DEFAULT CURRENT_DATE,
+                    due_at date,
+                    returned_at date,
+                    fine_amount numeric
                 )
-                conn.commit()
-            return 'journal'
-    finally:
-        conn.close()
+                """
+            )
+        conn.commit()
+    schema_cache.invalidate(cfg)
+    return 'journal'
 
 
 def get_columns(cfg: PostgresConfig, table_name: str) -> List[Dict]:
-    sql = SQL("""
-    SELECT column_name, data_type, is_nullable
-    FROM information_schema.columns
-    WHERE table_schema='public' AND table_name=%s
-    ORDER BY ordinal_position
-    """)
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (table_name,))
-            rows = cur.fetchall()
-            return [{"column_name": r[0], "data_type": r[1], "is_nullable": r[2]} for r in rows]
-    finally:
-        conn.close()
+    return schema_cache.get_columns(cfg, table_name)
 
 
 def get_journal_colmap(cfg: PostgresConfig, table_name: str) -> Dict[str, Optional[str]]:
@@ -117,52 +100,28 @@ def get_journal_colmap(cfg: PostgresConfig, table_name: str) -> Dict[str, Option
 
 
 def get_pk(cfg: PostgresConfig, table_name: str) -> Optional[str]:
-    sql = SQL("""
-    SELECT kcu.column_name
-    FROM information_schema.table_constraints tc
-    JOIN information_schema.key_column_usage kcu
-      ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
-    WHERE tc.constraint_type = 'PRIMARY KEY'
-      AND tc.table_schema = 'public' AND tc.table_name = %s
-    ORDER BY kcu.ordinal_position
-    LIMIT 1
-    """)
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (table_name,))
-            row = cur.fetchone()
-            return row[0] if row else None
-    finally:
-        conn.close()
+    return schema_cache.get_pk(cfg, table_name)
 
 
 def get_fk_map(cfg: PostgresConfig, table_name: str) -> Dict[str, Dict]:
     # returns mapping column_name -> {'referenced_table': tbl, 'referenced_column': col}
-    sql = SQL("""
-    SELECT kcu.column_name, ccu.table_name, ccu.column_name
-    FROM information_schema.table_constraints tc
-    JOIN information_schema.key_column_usage kcu
-      ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
-    JOIN information_schema.constraint_column_usage ccu
-      ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.constraint_schema
-    WHERE tc.constraint_type = 'FOREIGN KEY'
-      AND tc.table_schema = 'public' AND tc.table_name = %s
-    """)
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (table_name,))
-            rows = cur.fetchall()
-            result = {}
-            for r in rows:
-                result[r[0]] = {"referenced_table": r[1], "referenced_column": r[2]}
-            return result
-    finally:
-        conn.close()
+    return schema_cache.get_fk_map(cfg, table_name)
+
+
+@dataclass(frozen=True)
+class JoinedPlan:
+    """Rendered SELECT for the joined journal view (no ORDER BY) and the journal pk."""
+    select: str
+    pk: Optional[str]
+
 
+# (cfg key, table) -> (schema signature, plan)
+_plans: Dict[tuple, Tuple[str, JoinedPlan]] = {}
+_plans_lock = threading.Lock()
 
-def list_rows_joined(cfg: PostgresConfig, table_name: str) -> Tuple[List[str], List[Tuple]]:
+
+def _joined_select(cfg: PostgresConfig, table_name: str):
+    """SELECT journal columns plus client/book display and book_types columns, without ORDER BY."""
     # Determine fk columns to clients and books
     fk_map = get_fk_map(cfg, table_name)
     client_fk = None
@@ -173,82 +132,84 @@ def list_rows_joined(cfg: PostgresConfig, table_name: str) -> Tuple[List[str], L
         if meta['referenced_table'] == 'books':
             book_fk = {'col': col, 'ref_col': meta['referenced_column']}
 
-    # detect book_types fk through books
-    # we'll build join dynamically
+    # journal columns are listed explicitly instead of j.* so that any column
+    # change also changes the statement text and a new prepared statement is used
+    select_parts = [SQL("j.{}").format(Identifier(c['column_name'])) for c in get_columns(cfg, table_name)]
+    joins = []
+
+    if client_fk:
+        # pick client display column
+        client_cols = [c['column_name'] for c in schema_cache.get_columns(cfg, 'clients')]
+        disp = None
+        for cand in ('name', 'fio', 'full_name', 'email', 'phone'):
+            if cand in client_cols:
+                disp = cand
+                break
+        if not disp and client_cols:
+            disp = client_cols[0]
+        # alias as identifier c_<col>
+        select_parts.append(SQL("c.{col} AS {alias}").format(col=Identifier(disp), alias=Identifier("c_" + disp)))
+        joins.append(SQL("LEFT JOIN public.clients c ON j.{fk} = c.{ref}").format(fk=Identifier(client_fk['col']), ref=Identifier(client_fk['ref_col'])))
+
+    if book_fk:
+        # join books
+        book_cols = [c['column_name'] for c in schema_cache.get_columns(cfg, 'books')]
+        b_title = None
+        for cand in ('title', 'name'):
+            if cand in book_cols:
+                b_title = cand
+                break
+        if not b_title and book_cols:
+            b_title = book_cols[0]
+        select_parts.append(SQL("b.{col} AS {alias}").format(col=Identifier(b_title), alias=Identifier("b_" + b_title)))
+        joins.append(SQL("LEFT JOIN public.books b ON j.{bk_fk} = b.{bk_ref}").format(bk_fk=Identifier(book_fk['col']), bk_ref=Identifier(book_fk['ref_col'])))
+        # detect book_types fk on books
+        bt_fk = schema_cache.get_fk_to_table(cfg, 'books', 'book_types')
+        if bt_fk:
+            bt_cols = [c['column_name'] for c in schema_cache.get_columns(cfg, 'book_types')]
+            for c in bt_cols:
+                select_parts.append(SQL("bt.{col} AS {alias}").format(col=Identifier(c), alias=Identifier("bt_" + c)))
+            joins.append(SQL("LEFT JOIN public.book_types bt ON b.{bt_fk} = bt.{bt_ref}").format(bt_fk=Identifier(bt_fk['column_name']), bt_ref=Identifier(bt_fk['foreign_column'])))
+
+    select_sql = SQL(', ').join(select_parts)
+    join_sql = SQL(' ').join(joins) if joins else SQL('')
+    return SQL("SELECT {sel} FROM public.{tbl} j {joins}").format(sel=select_sql, tbl=Identifier(table_name), joins=join_sql)
+
+
+def joined_plan(cfg: PostgresConfig, table_name: str) -> JoinedPlan:
+    """Joined SELECT for `table_name`, composed once per schema version.
+
+    The statement is rebuilt only when the catalog signature of the library
+    tables changes (see schema_cache), so a refresh costs no introspection.
+    """
+    key = (astuple(cfg), table_name)
+    sig = schema_cache.signature(cfg)
+    with _plans_lock:
+        cached = _plans.get(key)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    composed = _joined_select(cfg, table_name)
     pk = get_pk(cfg, table_name)
-    conn = get_connection(cfg)
-    try:
-        with conn.cursor() as cur:
-            # get columns for journal table
-            cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name=%s ORDER BY ordinal_position", (table_name,))
-            journal_cols = [r[0] for r in cur.fetchall()]
-
-            select_parts = [SQL("j.*")]
-            joins = []
-
-            if client_fk:
-                # pick client display column
-                cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name='clients' ORDER BY ordinal_position")
-                client_cols = [r[0] for r in cur.fetchall()]
-                disp = None
-                for cand in ('name', 'fio', 'full_name', 'email', 'phone'):
-                    if cand in client_cols:
-                        disp = cand
-                        break
-                if not disp and client_cols:
-                    disp = client_cols[0]
-                # alias as identifier c_<col>
-                select_parts.append(SQL("c.{col} AS {alias}").format(col=Identifier(disp), alias=Identifier("c_" + disp)))
-                joins.append(SQL("LEFT JOIN public.clients c ON j.{fk} = c.{ref}").format(fk=Identifier(client_fk['col']), ref=Identifier(client_fk['ref_col'])))
-
-            if book_fk:
-                # join books
-                cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name='books' ORDER BY ordinal_position")
-                book_cols = [r[0] for r in cur.fetchall()]
-                b_title = None
-                for cand in ('title', 'name'):
-                    if cand in book_cols:
-                        b_title = cand
-                        break
-                if not b_title and book_cols:
-                    b_title = book_cols[0]
-                select_parts.append(SQL("b.{col} AS {alias}").format(col=Identifier(b_title), alias=Identifier("b_" + b_title)))
-                # detect book_types fk on books
-                cur.execute("SELECT kcu.column_name, ccu.table_name, ccu.column_name FROM information_schema.table_constraints tc JOIN information_schema.key_column_usage kcu ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema JOIN information_schema.constraint_column_usage ccu ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.constraint_schema WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_schema = 'public' AND tc.table_name = 'books'")
-                b_fk_rows = cur.fetchall()
-                bt_fk_col = None
-                bt_ref_col = None
-                for r in b_fk_rows:
-                    if r[1] == 'book_types':
-                        bt_fk_col = r[0]
-                        bt_ref_col = r[2]
-                        break
-                if bt_fk_col:
-                    # fetch book_types cols
-                    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name='book_types' ORDER BY ordinal_position")
-                    bt_cols = [r[0] for r in cur.fetchall()]
-                    for c in bt_cols:
-                        select_parts.append(SQL("bt.{col} AS {alias}").format(col=Identifier(c), alias=Identifier("bt_" + c)))
-                    joins.append(SQL("LEFT JOIN public.books b ON j.{bk_fk} = b.{bk_ref}").format(bk_fk=Identifier(book_fk['col']), bk_ref=Identifier(book_fk['ref_col'])))
-                    joins.append(SQL("LEFT JOIN public.book_types bt ON b.{bt_fk} = bt.{bt_ref}").format(bt_fk=Identifier(bt_fk_col), bt_ref=Identifier(bt_ref_col)))
-                else:
-                    # no book_types
-                    joins.append(SQL("LEFT JOIN public.books b ON j.{bk_fk} = b.{bk_ref}").format(bk_fk=Identifier(book_fk['col']), bk_ref=Identifier(book_fk['ref_col'])))
-
-            # Build final SQL
-            select_sql = SQL(', ').join(select_parts)
-            join_sql = SQL(' ').join(joins) if joins else SQL('')
-            if pk:
-                sql = SQL("SELECT {sel} FROM public.{tbl} j {joins} ORDER BY j.{pk} DESC").format(sel=select_sql, tbl=Identifier(table_name), joins=join_sql, pk=Identifier(pk))
-            else:
-                sql = SQL("SELECT {sel} FROM public.{tbl} j {joins}").format(sel=select_sql, tbl=Identifier(table_name), joins=join_sql)
+    plan = JoinedPlan(select=composed.as_string(), pk=pk)
+    with _plans_lock:
+        _plans[key] = (sig, plan)
+    return plan
 
-            cur.execute(sql)
-            rows = cur.fetchall()
-            cols = [d.name for d in cur.description]
-            return cols, rows
-    finally:
-        conn.close()
+
+def list_page(cfg: PostgresConfig, table_name: str, after=None, before=None, limit: int = paging.PAGE_SIZE,
+              query: Optional[paging.ListQuery] = None) -> Tuple[List[str], List[Tuple]]:
+    """One keyset page of the joined journal rows (pk descending unless `query` sorts), see paging.keyset_page."""
+    plan = joined_plan(cfg, table_name)
+    pk_expr = SQL("j.{}").format(Identifier(plan.pk)) if plan.pk else None
+    return paging.keyset_page(cfg, SQL(plan.select), pk_expr, after, before, limit, prepare=True, query=query, pk_col=plan.pk)
+
+
+def rows_by_pk(cfg: PostgresConfig, table_name: str, pks: List, query: Optional[paging.ListQuery] = None) -> Tuple[List[str], List[Tuple]]:
+    """Rows of list_page for the given journal primary keys (missing or filtered out keys are absent)."""
+    plan = joined_plan(cfg, table_name)
+    if not plan.pk:
+        raise ValueError(f"Journal table '{table_name}' has no primary key")
+    return paging.rows_by_pk(cfg, SQL(plan.select), SQL("j.{}").format(Identifier(plan.pk)), pks, prepare=True, query=query, pk_col=plan.pk)
 
 
 def count_active_loans_for_client(cfg: PostgresConfig, table: str, client_id: int) -> int:
@@ -262,13 +223,10 @@ def count_active_loans_for_client(cfg: PostgresConfig, table: str, client_id: in
     sql = SQL("SELECT COUNT(*) FROM public.{tbl} WHERE {client} = %s AND {ret} IS NULL").format(
         tbl=Identifier(table), client=Identifier(client_col), ret=Identifier(returned_col)
     )
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (client_id,))
             return cur.fetchone()[0]
-    finally:
-        conn.close()
 
 
 def is_book_available(cfg: PostgresConfig, table: str, book_id: int) -> bool:
@@ -281,13 +239,42 @@ def is_book_available(cfg: PostgresConfig, table: str, book_id: int) -> bool:
     sql = SQL("SELECT 1 FROM public.{tbl} WHERE {book} = %s AND {ret} IS NULL LIMIT 1").format(
         tbl=Identifier(table), book=Identifier(book_col), ret=Identifier(returned_col)
     )
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (book_id,))
             return cur.fetchone() is None
-    finally:
-        conn.close()
+
+
+def availability_map(cfg: PostgresConfig, table: str, book_ids: Optional[Iterable[int]] = None) -> Dict[int, bool]:
+    """Map book id -> available, computed with a single query over open loans.
+
+    With `book_ids` every requested id is present in the result. Without it
+    only books currently on hand are returned (as False), so callers should
+    use `.get(book_id, True)`.
+    """
+    colmap = get_journal_colmap(cfg, table)
+    book_col = colmap.get('book_id')
+    returned_col = colmap.get('returned_at')
+    ids = list(book_ids) if book_ids is not None else None
+    if not returned_col or ids == []:
+        # no returned indicator — treat every book as available (see is_book_available)
+        return {bid: True for bid in ids} if ids else {}
+
+    sql = SQL("SELECT DISTINCT {book} FROM public.{tbl} WHERE {ret} IS NULL").format(
+        tbl=Identifier(table), book=Identifier(book_col), ret=Identifier(returned_col)
+    )
+    params = ()
+    if ids is not None:
+        sql = SQL("{base} AND {book} = ANY(%s)").format(base=sql, book=Identifier(book_col))
+        params = (ids,)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            on_hand = {r[0] for r in cur.fetchall()}
+
+    if ids is None:
+        return {bid: False for bid in on_hand}
+    return {bid: bid not in on_hand for bid in ids}
 
 
 def issue_book(cfg: PostgresConfig, table: str, client_id: int, book_id: int, issued_at: date, due_at: Optional[date]) -> None:
@@ -310,13 +297,89 @@ def issue_book(cfg: PostgresConfig, table: str, client_id: int, book_id: int, is
         )
         params = (client_id, book_id, issued_at, due_at)
 
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
         conn.commit()
-    finally:
-        conn.close()
+
+
+MAX_ACTIVE_LOANS = 10
+
+ISSUED = 'issued'
+CLIENT_OVER_LIMIT = 'client_over_limit'
+BOOK_ON_HAND = 'book_on_hand'
+
+
+@dataclass(frozen=True)
+class IssueResult:
+    status: str  # ISSUED / CLIENT_OVER_LIMIT / BOOK_ON_HAND
+    journal_id: Optional[int] = None
+    active_loans: int = 0
+
+
+def issue_book_checked(cfg: PostgresConfig, table: str, client_id: int, book_id: int, issued_at: date, due_at: Optional[date], max_active: int = MAX_ACTIVE_LOANS) -> IssueResult:
+    """Check the client's loan limit and the book's availability and insert the loan atomically.
+
+    Transaction-level advisory locks on the book and the client serialize
+    concurrent issues of the same book / to the same client; the checks and the
+    conditional INSERT then run as one CTE. With pipeline support everything,
+    including the COMMIT, goes to the server in a single round trip.
+    """
+    colmap = get_journal_colmap(cfg, table)
+    client_col = Identifier(colmap['client_id'])
+    book_col = Identifier(colmap['book_id'])
+    returned_col = colmap.get('returned_at')
+    # without a returned column there are no open loans to check (as in count_active_loans_for_client)
+    open_sql = SQL("{} IS NULL").format(Identifier(returned_col)) if returned_col else SQL("FALSE")
+
+    cols = [colmap['client_id'], colmap['book_id'], colmap['issued_at']]
+    values = [SQL("%(client)s"), SQL("%(book)s"), SQL("%(issued)s")]
+    if due_at is not None:
+        cols.append(colmap['due_at'])
+        values.append(SQL("%(due)s"))
+    returning = Identifier(colmap['pk']) if colmap.get('pk') else SQL("NULL::int")
+
+    lock_sql = SQL("SELECT pg_advisory_xact_lock(hashtext(%(book_key)s), %(book)s), pg_advisory_xact_lock(hashtext(%(client_key)s), %(client)s)")
+    issue_sql = SQL("""
+        WITH active AS (
+            SELECT count(*) FILTER (WHERE {client} = %(client)s) AS client_cnt,
+                   count(*) FILTER (WHERE {book} = %(book)s) AS book_cnt
+            FROM public.{tbl}
+            WHERE {open} AND ({client} = %(client)s OR {book} = %(book)s)
+        ), ins AS (
+            INSERT INTO public.{tbl} ({cols})
+            SELECT {values} FROM active
+            WHERE client_cnt < %(max)s AND book_cnt = 0
+            RETURNING {returning}
+        )
+        SELECT EXISTS (SELECT 1 FROM ins), (SELECT * FROM ins), client_cnt, book_cnt FROM active
+    """).format(
+        client=client_col, book=book_col, tbl=Identifier(table), open=open_sql,
+        cols=SQL(', ').join([Identifier(c) for c in cols]), values=SQL(', ').join(values), returning=returning,
+    )
+    params = {
+        'client': client_id, 'book': book_id, 'issued': issued_at, 'due': due_at, 'max': max_active,
+        'book_key': f"{table}.book", 'client_key': f"{table}.client",
+    }
+
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            if psycopg.Pipeline.is_supported():
+                with conn.pipeline():
+                    cur.execute(lock_sql, params)
+                    cur.execute(issue_sql, params)
+                    conn.commit()
+            else:
+                cur.execute(lock_sql, params)
+                cur.execute(issue_sql, params)
+                conn.commit()
+            inserted, journal_id, client_cnt, book_cnt = cur.fetchone()
+
+    if inserted:
+        return IssueResult(ISSUED, journal_id, client_cnt + 1)
+    if client_cnt >= max_active:
+        return IssueResult(CLIENT_OVER_LIMIT, None, client_cnt)
+    return IssueResult(BOOK_ON_HAND, None, client_cnt)
 
 
 def return_book(cfg: PostgresConfig, table: str, pk_col: str, journal_id: int, returned_at: date, fine_amount: Optional[float]) -> None:
@@ -336,21 +399,116 @@ def return_book(cfg: PostgresConfig, table: str, pk_col: str, journal_id: int, r
             tbl=Identifier(table), ret=Identifier(returned_col), pk=Identifier(pk_col)
         )
         params = (returned_at, journal_id)
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
         conn.commit()
-    finally:
-        conn.close()
+
+
+RETURNED = 'returned'
+ALREADY_RETURNED = 'already_returned'
+NOT_FOUND = 'not_found'
+BEFORE_ISSUE = 'before_issue'
+
+
+@dataclass(frozen=True)
+class ReturnOutcome:
+    journal_id: int
+    status: str  # RETURNED / ALREADY_RETURNED / NOT_FOUND / BEFORE_ISSUE
+    days_overdue: int = 0
+    fine_amount: float = 0.0
+
+
+def _fine_rate_expr(cfg: PostgresConfig, book_alias: str):
+    """(LEFT JOIN to book_types, daily fine rate expression) for a books alias; rate is NULL-safe."""
+    bt_fk = schema_cache.get_fk_to_table(cfg, 'books', 'book_types')
+    if bt_fk:
+        bt_cols = [c['column_name'] for c in schema_cache.get_columns(cfg, 'book_types')]
+        for c in ('fine', 'bt_fine', 'fine_amount', 'penalty', 'rate'):
+            if c in bt_cols:
+                join = SQL("LEFT JOIN public.book_types bt ON {b}.{fk} = bt.{ref}").format(
+                    b=SQL(book_alias), fk=Identifier(bt_fk['column_name']), ref=Identifier(bt_fk['foreign_column']))
+                return join, SQL("COALESCE(bt.{}, 0)").format(Identifier(c))
+    return SQL(""), SQL("0")
+
+
+def return_books(cfg: PostgresConfig, table: str, journal_ids: Iterable[int], returned_at: date) -> List[ReturnOutcome]:
+    """Accept several books at once in one transaction; returns one outcome per requested id.
+
+    Fines are computed in the same statement from the book type's daily rate
+    (rate * days overdue) and stored when the journal has a fine column.
+    Rows already returned, also concurrently, are left untouched, and so are
+    rows issued after `returned_at` (the journal's check would fail the batch).
+    """
+    ids = list(dict.fromkeys(journal_ids))
+    if not ids:
+        return []
+    colmap = get_journal_colmap(cfg, table)
+    pk_col = colmap.get('pk')
+    returned_col = colmap.get('returned_at')
+    if not pk_col:
+        raise ValueError(f"Table '{table}' has no primary key; cannot accept returns")
+    if not returned_col:
+        raise ValueError(f"Table '{table}' has no return/returned column; cannot accept returns")
+    fks = get_fk_map(cfg, table)
+    book_fk = next((col for col, ref in fks.items() if ref['referenced_table'] == 'books'), colmap['book_id'])
+    book_ref = fks.get(book_fk, {}).get('referenced_column', 'id')
+    rate_join, rate = _fine_rate_expr(cfg, 'b')
+
+    set_parts = [SQL("{} = %(ret)s").format(Identifier(returned_col))]
+    if colmap.get('fine_amount'):
+        set_parts.append(SQL("{} = t.fine").format(Identifier(colmap['fine_amount'])))
+
+    sql = SQL("""
+        WITH req AS (
+            SELECT id, ord FROM unnest(%(ids)s::int[]) WITH ORDINALITY AS r(id, ord)
+        ), target AS (
+            SELECT j.{pk} AS id,
+                   GREATEST(%(ret)s::date - j.{due}, 0) AS days_over,
+                   {rate} * GREATEST(%(ret)s::date - j.{due}, 0) AS fine
+            FROM public.{tbl} j
+            JOIN req ON req.id = j.{pk}
+            LEFT JOIN public.books b ON j.{book} = b.{book_ref}
+            {rate_join}
+            WHERE j.{returned} IS NULL AND %(ret)s::date >= j.{issued}
+            FOR UPDATE OF j
+        ), upd AS (
+            UPDATE public.{tbl} j SET {set}
+            FROM target t
+            WHERE j.{pk} = t.id
+            RETURNING t.id, t.days_over, t.fine
+        )
+        SELECT req.id, upd.id IS NOT NULL, j0.{pk} IS NOT NULL,
+               j0.{returned} IS NULL AND %(ret)s::date < j0.{issued}, upd.days_over, upd.fine
+        FROM req
+        LEFT JOIN upd ON upd.id = req.id
+        LEFT JOIN public.{tbl} j0 ON j0.{pk} = req.id
+        ORDER BY req.ord
+    """).format(
+        pk=Identifier(pk_col), issued=Identifier(colmap['issued_at']), due=Identifier(colmap['due_at']), tbl=Identifier(table), book=Identifier(book_fk),
+        book_ref=Identifier(book_ref), rate=rate, rate_join=rate_join, returned=Identifier(returned_col),
+        set=SQL(', ').join(set_parts),
+    )
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {'ids': ids, 'ret': returned_at})
+            rows = cur.fetchall()
+        conn.commit()
+
+    outcomes = []
+    for jid, returned, found, too_early, days_over, fine in rows:
+        if returned:
+            outcomes.append(ReturnOutcome(jid, RETURNED, days_over or 0, float(fine or 0)))
+        elif too_early:
+            outcomes.append(ReturnOutcome(jid, BEFORE_ISSUE))
+        else:
+            outcomes.append(ReturnOutcome(jid, ALREADY_RETURNED if found else NOT_FOUND))
+    return outcomes
 
 
 def delete_row(cfg: PostgresConfig, table: str, pk_col: str, pk_value) -> None:
     sql = SQL("DELETE FROM public.{tbl} WHERE {pk} = %s").format(tbl=Identifier(table), pk=Identifier(pk_col))
-    conn = get_connection(cfg)
-    try:
+    with connection(cfg) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (pk_value,))
         conn.commit()
-    finally:
-        conn.close()
@@ -0,0 +1,198 @@
+"""Keyset pagination helper shared by the list repos.
+
+Pages are ordered by primary key descending (newest first), as the lists
+have always been shown. `after` continues downwards
+(`pk < after`), `before` goes back up (`pk > before`); rows are always
+returned in descending order.
+
+A `ListQuery` adds a sort column and column filters chosen in the view. The
+list query is then wrapped as a subquery so that every output column (also
+joined ones like `b_name`) can be filtered and sorted by name, and the page
+cursor becomes the pair (sort value, pk).
+"""
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from psycopg.sql import SQL, Composable, Identifier
+
+from ..config import PostgresConfig
+from ..db import connection
+
+PAGE_SIZE = 500
+
+# operator prefixes a filter text may start with, longest first
+FILTER_OPERATORS = ('>=', '<=', '<>', '!=', '=', '>', '<')
+
+
+@dataclass(frozen=True)
+class ListQuery:
+    """Server-side sort and filters of a list view.
+
+    `filters` are (column, text) pairs over the output columns of the list
+    query. Plain text matches a case-insensitive substring of the value; a
+    leading =, <>, !=, <, <=, > or >= compares the value with the rest of the
+    text. Rows with a NULL sort value come last in both directions.
+    """
+
+    sort_col: Optional[str] = None
+    descending: bool = False
+    filters: Tuple[Tuple[str, str], ...] = ()
+
+    def is_default(self) -> bool:
+        return self.sort_col is None and not self.filters
+
+
+def _filter_condition(col: Composable, text: str):
+    text = text.strip()
+    for op in FILTER_OPERATORS:
+        if text.startswith(op):
+            value = text[len(op):].strip()
+            if not value:
+                return None, []
+            return SQL("{c} " + op + " %s").format(c=col), [value]
+    # % and _ typed by the user are literal characters
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return SQL("{c}::text ILIKE %s").format(c=col), [f"%{escaped}%"]
+
+
+def _filter_conditions(query: Optional[ListQuery]):
+    conds, params = [], []
+    for name, text in (query.filters if query else ()):
+        cond, p = _filter_condition(Identifier('s', name), text)
+        if cond is not None:
+            conds.append(cond)
+            params += p
+    return conds, params
+
+
+def _sorted_cursor(col: Composable, pk: Composable, value: Any, pk_value: Any, descending: bool, forward: bool):
+    """Rows after (forward) or before the cursor row in `col, pk` order, NULL sort values last."""
+    if forward:
+        cmp = SQL('<' if descending else '>')
+        if value is None:
+            return SQL("({col} IS NULL AND {pk} {cmp} %s)").format(col=col, pk=pk, cmp=cmp), [pk_value]
+        return SQL("({col} {cmp} %s OR ({col} = %s AND {pk} {cmp} %s) OR {col} IS NULL)").format(
+            col=col, pk=pk, cmp=cmp), [value, value, pk_value]
+    cmp = SQL('>' if descending else '<')
+    if value is None:
+        return SQL("({col} IS NOT NULL OR {pk} {cmp} %s)").format(col=col, pk=pk, cmp=cmp), [pk_value]
+    return SQL("({col} {cmp} %s OR ({col} = %s AND {pk} {cmp} %s))").format(
+        col=col, pk=pk, cmp=cmp), [value, value, pk_value]
+
+
+def _query_page(cfg, select_sql, pk_col, query: ListQuery, after, before, limit):
+    conds, params = _filter_conditions(query)
+    pk = Identifier('s', pk_col) if pk_col else None
+    col = Identifier('s', query.sort_col) if query.sort_col else None
+    backwards = pk is not None and before is not None
+    if pk is None:
+        # no paging without a primary key, as in keyset_page
+        order = SQL("{} {} NULLS LAST").format(col, SQL('DESC' if query.descending else 'ASC')) if col else None
+    elif col is not None:
+        cursor = before if backwards else after
+        if cursor is not None:
+            cond, p = _sorted_cursor(col, pk, cursor[0], cursor[1], query.descending, forward=not backwards)
+            conds.append(cond)
+            params += p
+        # going back up reads the reversed order and flips the rows afterwards
+        direction = SQL('DESC' if query.descending != backwards else 'ASC')
+        order = SQL("{col} {d} NULLS {n}, {pk} {d}").format(col=col, pk=pk, d=direction, n=SQL('FIRST' if backwards else 'LAST'))
+    else:
+        if backwards:
+            conds.append(SQL("{} > %s").format(pk))
+            params.append(before)
+        elif after is not None:
+            conds.append(SQL("{} < %s").format(pk))
+            params.append(after)
+        order = SQL("{} {}").format(pk, SQL('ASC' if backwards else 'DESC'))
+
+    sql = SQL("SELECT * FROM ({sel}) s").format(sel=select_sql)
+    if conds:
+        sql = SQL("{} WHERE {}").format(sql, SQL(' AND ').join(conds))
+    if order is not None:
+        sql = SQL("{} ORDER BY {}").format(sql, order)
+    if pk is not None:
+        sql = SQL("{} LIMIT %s").format(sql)
+        params.append(limit)
+
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cols = [d.name for d in cur.description]
+    if backwards:
+        rows.reverse()
+    return cols, rows
+
+
+def keyset_page(
+    cfg: PostgresConfig,
+    select_sql: Composable,
+    pk_expr: Optional[Composable],
+    after: Any = None,
+    before: Any = None,
+    limit: int = PAGE_SIZE,
+    prepare: bool = False,
+    query: Optional[ListQuery] = None,
+    pk_col: Optional[str] = None,
+) -> Tuple[List[str], List[Tuple]]:
+    """Run `select_sql` (a SELECT ... FROM ... without WHERE/ORDER BY) as one keyset page.
+
+    Without a primary key (`pk_expr` is None) paging is impossible and the
+    whole result is returned. `prepare=True` runs it as a server-side prepared
+    statement, worthwhile when `select_sql` is a cached plan reused on every call.
+    With a sorting or filtering `query`, `pk_col` is the primary key's output
+    column name and `after`/`before` are (sort value, pk) pairs when sorted.
+    """
+    if query is not None and not query.is_default():
+        return _query_page(cfg, select_sql, pk_col if pk_expr is not None else None, query, after, before, limit)
+    params: list = []
+    if pk_expr is None:
+        sql = select_sql
+    elif before is not None:
+        sql = SQL("{sel} WHERE {pk} > %s ORDER BY {pk} ASC LIMIT %s").format(sel=select_sql, pk=pk_expr)
+        params = [before, limit]
+    elif after is not None:
+        sql = SQL("{sel} WHERE {pk} < %s ORDER BY {pk} DESC LIMIT %s").format(sel=select_sql, pk=pk_expr)
+        params = [after, limit]
+    else:
+        sql = SQL("{sel} ORDER BY {pk} DESC LIMIT %s").format(sel=select_sql, pk=pk_expr)
+        params = [limit]
+
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params, prepare=prepare or None)
+            rows = cur.fetchall()
+            cols = [d.name for d in cur.description]
+    if before is not None and pk_expr is not None:
+        rows.reverse()
+    return cols, rows
+
+
+def rows_by_pk(
+    cfg: PostgresConfig,
+    select_sql: Composable,
+    pk_expr: Composable,
+    pks: List[Any],
+    prepare: bool = False,
+    query: Optional[ListQuery] = None,
+    pk_col: Optional[str] = None,
+) -> Tuple[List[str], List[Tuple]]:
+    """Rows of `select_sql` with the given primary keys, pk descending like the pages.
+
+    Used to refresh single rows of a loaded page after a change notification.
+    With filters in `query` only rows still matching them are returned.
+    """
+    conds, params = _filter_conditions(query)
+    if conds:
+        sql = SQL("SELECT * FROM ({sel}) s WHERE {pk} = ANY(%s) AND {conds} ORDER BY {pk} DESC").format(
+            sel=select_sql, pk=Identifier('s', pk_col), conds=SQL(' AND ').join(conds))
+        prepare = False
+    else:
+        sql = SQL("{sel} WHERE {pk} = ANY(%s) ORDER BY {pk} DESC").format(sel=select_sql, pk=pk_expr)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, [list(pks)] + params, prepare=prepare or None)
+            rows = cur.fetchall()
+            cols = [d.name for d in cur.description]
+    return cols, rows
@@ -0,0 +1,123 @@
+"""Optional trigger-maintained summary of report-relevant journal rows.
+
+`report_loan_summary` keeps only the journal rows the reports look at: open
+loans, overdue returns and rows with an explicit fine. Triggers on the journal
+keep it in sync on INSERT/UPDATE/DELETE/TRUNCATE. Columns use the names the
+reports expect (issued_at, due_at, returned_at, fine_amount) whatever the
+journal calls them, see `journal_repo.get_journal_colmap`.
+
+`reports_repo` reads from the summary when it is installed and falls back to
+the journal otherwise. Installing/removing is an admin action.
+"""
+from psycopg.sql import SQL, Identifier
+
+from ..config import PostgresConfig
+from ..db import connection
+from . import journal_repo, schema_cache
+
+SUMMARY_TABLE = 'report_loan_summary'
+_FUNCTION = 'report_loan_summary_sync'
+_TRIGGER = 'trg_report_loan_summary'
+_TRUNCATE_TRIGGER = 'trg_report_loan_summary_truncate'
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE public.report_loan_summary (
+    id integer PRIMARY KEY,
+    client_id integer,
+    book_id integer,
+    issued_at date,
+    due_at date,
+    returned_at date,
+    fine_amount numeric
+);
+CREATE INDEX report_loan_summary_active_idx ON public.report_loan_summary (issued_at) WHERE returned_at IS NULL;
+CREATE INDEX report_loan_summary_returned_idx ON public.report_loan_summary (returned_at) WHERE returned_at IS NOT NULL;
+"""
+
+
+def is_installed(cfg: PostgresConfig) -> bool:
+    return schema_cache.table_exists(cfg, SUMMARY_TABLE)
+
+
+def _source_exprs(colmap, rec: str):
+    """Summary column values and the "report-relevant" condition for a journal record alias."""
+    def col(logical):
+        name = colmap.get(logical)
+        return SQL("{}.{}").format(SQL(rec), Identifier(name)) if name else SQL("NULL")
+
+    values = SQL(', ').join([col('pk'), col('client_id'), col('book_id'), col('issued_at'), col('due_at'), col('returned_at'), col('fine_amount')])
+
+    conds = []
+    if colmap.get('returned_at'):
+        conds.append(SQL("{ret} IS NULL").format(ret=col('returned_at')))
+        conds.append(SQL("{ret} > {due}").format(ret=col('returned_at'), due=col('due_at')))
+    else:
+        # without a return date every loan counts as open
+        conds.append(SQL("TRUE"))
+    if colmap.get('fine_amount'):
+        conds.append(SQL("{fine} > 0").format(fine=col('fine_amount')))
+    return values, SQL(' OR ').join(conds)
+
+
+def install(cfg: PostgresConfig) -> int:
+    """Create (or re-create) the summary table and its triggers; returns rows loaded."""
+    table = journal_repo.detect_journal_table(cfg)
+    colmap = journal_repo.get_journal_colmap(cfg, table)
+    if not colmap.get('pk'):
+        raise ValueError(f"Journal table '{table}' has no primary key")
+
+    new_values, new_cond = _source_exprs(colmap, 'NEW')
+    j_values, j_cond = _source_exprs(colmap, 'j')
+    cols = SQL("id, client_id, book_id, issued_at, due_at, returned_at, fine_amount")
+
+    function_sql = SQL("""
+        CREATE OR REPLACE FUNCTION public.{fn}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE public.{summary};
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM public.{summary} WHERE id = OLD.{pk};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF {cond} THEN
+                    INSERT INTO public.{summary} ({cols}) VALUES ({vals});
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """).format(fn=Identifier(_FUNCTION), summary=Identifier(SUMMARY_TABLE), pk=Identifier(colmap['pk']), cond=new_cond, cols=cols, vals=new_values)
+
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            # block journal writes until the initial load and the triggers are in place
+            cur.execute(SQL("LOCK TABLE public.{} IN SHARE ROW EXCLUSIVE MODE").format(Identifier(table)))
+            cur.execute(SQL("DROP TABLE IF EXISTS public.{}").format(Identifier(SUMMARY_TABLE)))
+            cur.execute(_CREATE_TABLE_SQL)
+            cur.execute(function_sql)
+            for trg, spec in ((_TRIGGER, "AFTER INSERT OR UPDATE OR DELETE ON public.{tbl} FOR EACH ROW"),
+                              (_TRUNCATE_TRIGGER, "AFTER TRUNCATE ON public.{tbl} FOR EACH STATEMENT")):
+                cur.execute(SQL("DROP TRIGGER IF EXISTS {trg} ON public.{tbl}").format(trg=Identifier(trg), tbl=Identifier(table)))
+                cur.execute(SQL("CREATE TRIGGER {trg} " + spec + " EXECUTE FUNCTION public.{fn}()").format(
+                    trg=Identifier(trg), tbl=Identifier(table), fn=Identifier(_FUNCTION)))
+            cur.execute(SQL("INSERT INTO public.{summary} ({cols}) SELECT {vals} FROM public.{tbl} j WHERE {cond}").format(
+                summary=Identifier(SUMMARY_TABLE), cols=cols, vals=j_values, tbl=Identifier(table), cond=j_cond))
+            loaded = cur.rowcount
+        conn.commit()
+    schema_cache.invalidate(cfg)
+    return loaded
+
+
+def uninstall(cfg: PostgresConfig) -> None:
+    """Drop the summary table, its triggers and function; reports go back to live queries."""
+    table = journal_repo.detect_journal_table(cfg)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            for trg in (_TRIGGER, _TRUNCATE_TRIGGER):
+                cur.execute(SQL("DROP TRIGGER IF EXISTS {trg} ON public.{tbl}").format(trg=Identifier(trg), tbl=Identifier(table)))
+            cur.execute(SQL("DROP FUNCTION IF EXISTS public.{}()").format(Identifier(_FUNCTION)))
+            cur.execute(SQL("DROP TABLE IF EXISTS public.{}").format(Identifier(SUMMARY_TABLE)))
+        conn.commit()
+    schema_cache.invalidate(cfg)
@@ -0,0 +1,178 @@
+"""Process-wide cache of table metadata (columns, PK, FKs) for the library tables.
+
+All metadata is loaded with a single pg_catalog query and shared by every repo.
+The cache is invalidated explicitly via `invalidate()` or automatically when the
+catalog signature of the tracked tables changes (checked at most once per
+`CHECK_INTERVAL` seconds).
+"""
+import threading
+import time
+from dataclasses import dataclass, field, astuple
+from typing import Dict, List, Optional
+
+from ..config import PostgresConfig
+from ..db import connection
+
+# tables the app works with; journal may be named any of the candidates,
+# report_loan_summary is the optional reporting layer (see report_summary)
+TRACKED_TABLES = ('clients', 'books', 'book_types', 'journal', 'loans', 'issues', 'report_loan_summary')
+
+# seconds between DDL-change probes
+CHECK_INTERVAL = 30.0
+
+_META_SQL = """
+SELECT 'col' AS kind, c.relname, a.attnum, a.attname,
+       format_type(a.atttypid, NULL) AS data_type,
+       CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS is_nullable,
+       NULL::name AS ref_table, NULL::name AS ref_column
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relname = ANY(%(tables)s)
+  AND c.relkind IN ('r', 'p') AND a.attnum > 0 AND NOT a.attisdropped
+UNION ALL
+SELECT CASE WHEN con.contype = 'p' THEN 'pk' ELSE 'fk' END, c.relname, k.ord::int, a.attname,
+       NULL, NULL, rc.relname, ra.attname
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+CROSS JOIN LATERAL unnest(con.conkey, COALESCE(con.confkey, con.conkey)) WITH ORDINALITY AS k(attnum, refnum, ord)
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+LEFT JOIN pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.refnum
+WHERE n.nspname = 'public' AND c.relname = ANY(%(tables)s) AND con.contype IN ('p', 'f')
+ORDER BY 1, 2, 3
+"""
+
+# any ALTER TABLE / constraint change rewrites the catalog rows and bumps their xmin
+_SIGNATURE_SQL = """
+SELECT md5(COALESCE(string_agg(sig, ',' ORDER BY sig), ''))
+FROM (
+    SELECT c.oid::text || ':' || c.xmin::text AS sig
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relname = ANY(%(tables)s)
+    UNION ALL
+    SELECT a.attrelid::text || '.' || a.attnum || ':' || a.xmin::text
+    FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relname = ANY(%(tables)s) AND a.attnum > 0
+    UNION ALL
+    SELECT con.oid::text || ':' || con.xmin::text
+    FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relname = ANY(%(tables)s)
+) s
+"""
+
+
+@dataclass
+class TableMeta:
+    name: str
+    columns: List[Dict] = field(default_factory=list)
+    pk: Optional[str] = None
+    # column_name -> {'referenced_table': ..., 'referenced_column': ...}
+    fks: Dict[str, Dict] = field(default_factory=dict)
+
+    def column_names(self) -> List[str]:
+        return [c['column_name'] for c in self.columns]
+
+
+@dataclass
+class _Snapshot:
+    tables: Dict[str, TableMeta]
+    signature: str
+    checked_at: float
+
+
+_snapshots: Dict[tuple, _Snapshot] = {}
+_lock = threading.Lock()
+
+
+def _load(cfg: PostgresConfig) -> _Snapshot:
+    params = {'tables': list(TRACKED_TABLES)}
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(_SIGNATURE_SQL, params)
+            signature = cur.fetchone()[0]
+            cur.execute(_META_SQL, params)
+            rows = cur.fetchall()
+
+    tables: Dict[str, TableMeta] = {}
+    for kind, tbl, _pos, col, data_type, is_nullable, ref_table, ref_col in rows:
+        meta = tables.setdefault(tbl, TableMeta(tbl))
+        if kind == 'col':
+            meta.columns.append({"column_name": col, "data_type": data_type, "is_nullable": is_nullable})
+        elif kind == 'pk':
+            # keep first PK column, like the information_schema queries did
+            if meta.pk is None:
+                meta.pk = col
+        else:
+            meta.fks[col] = {"referenced_table": ref_table, "referenced_column": ref_col}
+    return _Snapshot(tables=tables, signature=signature, checked_at=time.monotonic())
+
+
+def _probe_signature(cfg: PostgresConfig) -> str:
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(_SIGNATURE_SQL, {'tables': list(TRACKED_TABLES)})
+            return cur.fetchone()[0]
+
+
+def _snapshot(cfg: PostgresConfig) -> _Snapshot:
+    key = astuple(cfg)
+    with _lock:
+        snap = _snapshots.get(key)
+    if snap is not None:
+        if time.monotonic() - snap.checked_at < CHECK_INTERVAL:
+            return snap
+        if _probe_signature(cfg) == snap.signature:
+            snap.checked_at = time.monotonic()
+            return snap
+    snap = _load(cfg)
+    with _lock:
+        _snapshots[key] = snap
+    return snap
+
+
+def invalidate(cfg: Optional[PostgresConfig] = None) -> None:
+    """Drop cached metadata for `cfg` (or for every config when None)."""
+    with _lock:
+        if cfg is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(astuple(cfg), None)
+
+
+def signature(cfg: PostgresConfig) -> str:
+    """Catalog signature of the tracked tables; changes on any DDL touching them."""
+    return _snapshot(cfg).signature
+
+
+def table_meta(cfg: PostgresConfig, table_name: str) -> Optional[TableMeta]:
+    """Return cached metadata for a public table, or None if it does not exist."""
+    return _snapshot(cfg).tables.get(table_name)
+
+
+def table_exists(cfg: PostgresConfig, table_name: str) -> bool:
+    return table_meta(cfg, table_name) is not None
+
+
+def get_columns(cfg: PostgresConfig, table_name: str) -> List[Dict]:
+    meta = table_meta(cfg, table_name)
+    return [dict(c) for c in meta.columns] if meta else []
+
+
+def get_pk(cfg: PostgresConfig, table_name: str) -> Optional[str]:
+    meta = table_meta(cfg, table_name)
+    return meta.pk if meta else None
+
+
+def get_fk_map(cfg: PostgresConfig, table_name: str) -> Dict[str, Dict]:
+    meta = table_meta(cfg, table_name)
+    return {k: dict(v) for k, v in meta.fks.items()} if meta else {}
+
+
+def get_fk_to_table(cfg: PostgresConfig, table_name: str, referenced_table: str) -> Optional[Dict]:
+    """First FK of `table_name` pointing to `referenced_table` as {'column_name', 'foreign_column'}."""
+    for col, ref in get_fk_map(cfg, table_name).items():
+        if ref['referenced_table'] == referenced_table:
+            return {"column_name": col, "foreign_column": ref['referenced_column']}
+    return None
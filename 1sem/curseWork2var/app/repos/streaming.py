@@ -0,0 +1,40 @@
+"""Server-side (named) cursor streaming for large result sets.
+
+`stream_query` keeps the pooled connection for as long as the caller iterates,
+fetching `itersize` rows per round trip, so memory stays bounded regardless of
+the result size. Inside a worker with an active CancelScope every batch checks
+for cancellation.
+"""
+import itertools
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from psycopg.sql import Composable
+
+from ..config import PostgresConfig
+from ..db import check_cancelled, connection
+
+# rows per FETCH from the server-side cursor
+ITERSIZE = 2000
+
+_cursor_ids = itertools.count(1)
+
+
+@contextmanager
+def stream_query(cfg: PostgresConfig, sql: Composable, params=None, itersize: int = ITERSIZE):
+    """Execute `sql` on a named cursor; yields (columns, iterator of row batches)."""
+    with connection(cfg) as conn:
+        with conn.cursor(name=f"stream_{next(_cursor_ids)}") as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            cols = [d.name for d in cur.description]
+
+            def batches() -> Iterator[List[Tuple]]:
+                while True:
+                    check_cancelled()
+                    rows = cur.fetchmany(itersize)
+                    if not rows:
+                        return
+                    yield rows
+
+            yield cols, batches()
@@ -0,0 +1,168 @@
+"""Type-ahead search over clients and books.
+
+A row matches when every word of the search text occurs (ILIKE, any case) in
+its search document: the table's name columns, for clients also the passport
+columns, concatenated with `||` so that the expression is immutable and can be
+indexed. With the `pg_trgm` extension and the GIN indexes from
+`install_indexes()` the ILIKE conditions are answered by the index and hits
+are ranked by `word_similarity`; without them the same query scans the table
+and ranks by text. A number also matches the primary key.
+
+Installing the indexes is an admin action, like the journal indexes.
+"""
+import threading
+from dataclasses import astuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg.sql import SQL, Composable, Identifier
+
+from ..config import PostgresConfig
+from ..db import connection
+from . import schema_cache
+
+# hits returned per query; the completer shows no more
+SEARCH_LIMIT = 20
+
+EXTENSION = 'pg_trgm'
+_TEXT_TYPES = ('text', 'character varying', 'character')
+
+# per table: (name column candidates, extra column prefixes)
+_SEARCH_COLUMNS = {
+    'clients': (('last_name', 'first_name', 'father_name', 'name', 'fio', 'full_name'), ('passp',)),
+    'books': (('title', 'name'), ()),
+}
+
+_trgm_cache: Dict[tuple, bool] = {}
+_trgm_lock = threading.Lock()
+
+
+def search_columns(cfg: PostgresConfig, table: str) -> Tuple[List[str], List[str]]:
+    """(name columns, extra columns) of `table` that make up its search document."""
+    cols = [c['column_name'] for c in schema_cache.get_columns(cfg, table) if c['data_type'] in _TEXT_TYPES]
+    names, prefixes = _SEARCH_COLUMNS.get(table, ((), ()))
+    name_cols = [c for c in names if c in cols]
+    extra_cols = [c for c in cols if c.startswith(prefixes) and c not in name_cols] if prefixes else []
+    if not name_cols and not extra_cols:
+        name_cols = cols
+    return name_cols, extra_cols
+
+
+def document_expr(columns: Sequence[str], alias: Optional[str] = None) -> Composable:
+    """The search document of a row; index and queries must use exactly this expression."""
+    parts = [SQL("COALESCE({}::text, '')").format(Identifier(alias, c) if alias else Identifier(c)) for c in columns]
+    return SQL("(") + SQL(" || ' ' || ").join(parts) + SQL(")")
+
+
+def index_name(table: str) -> str:
+    return f"{table}_search_trgm"
+
+
+def has_trgm(cfg: PostgresConfig) -> bool:
+    """True if pg_trgm is installed in the database (cached, see install_indexes)."""
+    key = astuple(cfg)
+    with _trgm_lock:
+        if key in _trgm_cache:
+            return _trgm_cache[key]
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = %s", (EXTENSION,))
+            found = cur.fetchone() is not None
+    with _trgm_lock:
+        _trgm_cache[key] = found
+    return found
+
+
+def _like_pattern(word: str) -> str:
+    # % and _ typed by the user are literal characters
+    return '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search(cfg: PostgresConfig, table: str, select_cols: Composable, text: str, limit: int = SEARCH_LIMIT) -> List[Tuple]:
+    """Rows (`select_cols` of `table` as alias t) matching `text`, best hits first."""
+    words = text.split()
+    if not words:
+        return []
+    pk = schema_cache.get_pk(cfg, table)
+    name_cols, extra_cols = search_columns(cfg, table)
+    if not name_cols and not extra_cols:
+        return []
+    doc = document_expr(name_cols + extra_cols, 't')
+    conds: List[Composable] = []
+    params: List[Any] = []
+    for w in words:
+        conds.append(SQL("{} ILIKE %s").format(doc))
+        params.append(_like_pattern(w))
+    where = SQL(" AND ").join(conds)
+    order_parts: List[Composable] = []
+    if pk and text.strip().isdigit():
+        where = SQL("({}) OR t.{} = %s").format(where, Identifier(pk))
+        params.append(int(text.strip()))
+        # the row with that id first
+        order_parts.append(SQL("t.{} = %s DESC").format(Identifier(pk)))
+        params.append(int(text.strip()))
+    if has_trgm(cfg):
+        order_parts.append(SQL("word_similarity(%s, {}) DESC").format(doc))
+        params.append(text.strip())
+    else:
+        order_parts.append(doc)
+    if pk:
+        order_parts.append(SQL("t.{} DESC").format(Identifier(pk)))
+    order = SQL(", ").join(order_parts)
+    sql = SQL("SELECT {cols} FROM public.{tbl} t WHERE {where} ORDER BY {order} LIMIT %s").format(
+        cols=select_cols, tbl=Identifier(table), where=where, order=order)
+    params.append(limit)
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+
+def by_ids(cfg: PostgresConfig, table: str, select_cols: Composable, ids: Sequence) -> List[Tuple]:
+    """Rows (`select_cols` as alias t) with the given primary keys, e.g. for the current value of a form."""
+    pk = schema_cache.get_pk(cfg, table)
+    if not pk or not ids:
+        return []
+    sql = SQL("SELECT {cols} FROM public.{tbl} t WHERE t.{pk} = ANY(%s)").format(
+        cols=select_cols, tbl=Identifier(table), pk=Identifier(pk))
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (list(ids),))
+            return cur.fetchall()
+
+
+def trgm_available(cfg: PostgresConfig) -> bool:
+    """True if the server ships pg_trgm, so that install_indexes can create it."""
+    with connection(cfg) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = %s", (EXTENSION,))
+            return cur.fetchone() is not None
+
+
+def install_indexes(cfg: PostgresConfig) -> List[str]:
+    """Create pg_trgm and a GIN trigram index on the search document of clients and books; returns index names."""
+    if not trgm_available(cfg):
+        raise ValueError("На сервере PostgreSQL нет расширения pg_trgm")
+    created = []
+    with connection(cfg) as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SQL("CREATE EXTENSION IF NOT EXISTS {}").format(Identifier(EXTENSION)))
+                for table in _SEARCH_COLUMNS:
+                    if not schema_cache.table_exists(cfg, table):
+                        continue
+                    name_cols, extra_cols = search_columns(cfg, table)
+                    if not name_cols and not extra_cols:
+                        continue
+                    name = index_name(table)
+                    # a failed concurrent build leaves an invalid index behind under the same name
+                    cur.execute(SQL("DROP INDEX CONCURRENTLY IF EXISTS public.{}").format(Identifier(name)))
+                    cur.execute(SQL("CREATE INDEX CONCURRENTLY {name} ON public.{tbl} USING gin ({doc} gin_trgm_ops)").format(
+                        name=Identifier(name), tbl=Identifier(table), doc=document_expr(name_cols + extra_cols)))
+                    created.append(name)
+        finally:
+            conn.autocommit = False
+    with _trgm_lock:
+        _trgm_cache.pop(astuple(cfg), None)
+    return created
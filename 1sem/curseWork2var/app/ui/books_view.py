@@ -1,4 +1,4 @@
-from typing import List
+from functools import partial
 
 from PySide6.QtWidgets import (
     QWidget,
@@ -9,39 +9,15 @@ from PySide6.QtWidgets import (
     QMessageBox,
 )
 from PySide6.QtWidgets import QSizePolicy
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
 
 from ..config import PostgresConfig
 from ..repos import books_repo
+from ..repos.paging import PAGE_SIZE
 from .book_form import BookForm
-
-
-class BooksTableModel(QAbstractTableModel):
-    def __init__(self, columns: List[str], rows: List[tuple]):
-        super().__init__()
-        self._columns = columns
-        self._rows = rows
-
-    def rowCount(self, parent=QModelIndex()):
-        return len(self._rows)
-
-    def columnCount(self, parent=QModelIndex()):
-        return len(self._columns)
-
-    def data(self, index: QModelIndex, role=Qt.DisplayRole):
-        if not index.isValid():
-            return None
-        if role in (Qt.DisplayRole, Qt.EditRole):
-            val = self._rows[index.row()][index.column()]
-            return "" if val is None else str(val)
-        return None
-
-    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
-        if role != Qt.DisplayRole:
-            return None
-        if orientation == Qt.Horizontal:
-            return self._columns[section]
-        return section + 1
+from .column_widths import ColumnAutoSizer
+from .filter_bar import FilterBar, HeaderSort, is_filter_error, list_query
+from .keyset_model import KeysetTableModel, connect_top_prefetch
+from .query_runner import QueryRunner, LoadingIndicator
 
 
 class BooksView(QWidget):
@@ -54,7 +30,13 @@ class BooksView(QWidget):
         self.resize(900, 400)
 
         self.table = QTableView()
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.table)
         self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # sorting and filtering run on the server, see repos.paging.ListQuery
+        self.filter_bar = FilterBar(self.table)
+        self._sort = HeaderSort(self.table, self.load_data)
+        self.filter_bar.changed.connect(self.load_data)
 
         self.btn_refresh = QPushButton("Обновить")
         self.btn_open = QPushButton("Открыть")
@@ -62,8 +44,13 @@ class BooksView(QWidget):
         self.btn_edit = QPushButton("Изменить")
         self.btn_delete = QPushButton("Удалить")
 
+        self._runner = QueryRunner(self)
+        self._runner.finished.connect(self._on_loaded)
+        self._runner.failed.connect(self._on_load_failed)
+
         btn_layout = QHBoxLayout()
         btn_layout.addWidget(self.btn_refresh)
+        btn_layout.addWidget(LoadingIndicator(self._runner))
         btn_layout.addStretch()
         btn_layout.addWidget(self.btn_open)
         btn_layout.addWidget(self.btn_add)
@@ -71,6 +58,7 @@ class BooksView(QWidget):
         btn_layout.addWidget(self.btn_delete)
 
         main_layout = QVBoxLayout(self)
+        main_layout.addWidget(self.filter_bar)
         main_layout.addWidget(self.table)
         main_layout.addLayout(btn_layout)
 
@@ -86,21 +74,49 @@ class BooksView(QWidget):
             self.btn_edit.setEnabled(False)
             self.btn_delete.setEnabled(False)
 
+        connect_top_prefetch(self.table)
+
+        self.model = None
         self._columns = []
-        self._rows = []
         self._pk = None
         self._fk = None
 
         self.load_data()
 
     def load_data(self):
+        # the first page is fetched on a worker thread, see _on_loaded; a refresh
+        # re-reads the whole loaded window so that it can be merged as a diff
+        query = list_query(self._sort, self.filter_bar)
+        same_query = self.model is not None and self.model.query == query
+        limit = self.model.refresh_limit() if same_query else PAGE_SIZE
+        self._runner.run(self._query, limit, query)
+
+    def _query(self, limit, query):
+        pk = books_repo.get_pk(self.cfg)
+        fk = books_repo.get_fk_to_table(self.cfg, 'book_types')
+        cols, rows = books_repo.list_page(self.cfg, limit=limit, query=query)
+        return limit, query, pk, fk, cols, rows
+
+    def _on_load_failed(self, e):
+        if is_filter_error(e):
+            QMessageBox.warning(self, "Ошибка", "Значение фильтра не подходит к типу столбца")
+            return
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить книги: {type(e).__name__}")
+
+    def _on_loaded(self, result):
         try:
-            self._columns, self._rows = books_repo.list_rows_joined(self.cfg)
-            self._pk = books_repo.get_pk(self.cfg)
-            self._fk = books_repo.get_fk_to_table(self.cfg, 'book_types')
-            self.model = BooksTableModel(self._columns, self._rows)
+            limit, query, self._pk, self._fk, cols, rows = result
+            if self.model is not None and self.model.query == query and self.model.merge_first_page(cols, rows, limit):
+                return
+            # further rows are pulled page by page as the table scrolls
+            self.model = KeysetTableModel(partial(books_repo.list_page, self.cfg, query=query), self._pk, query=query)
+            self.model.fetch_failed.connect(self._on_load_failed)
+            self.model.set_first_page(cols, rows)
+            self._columns = self.model.columns()
             self.table.setModel(self.model)
-            self.table.resizeColumnsToContents()
+            self._sizer.apply()
+            self.filter_bar.set_columns(self._columns)
+            self._sort.show_indicator()
             # disable edit/delete if no primary key
             if not self._pk:
                 self.btn_edit.setEnabled(False)
@@ -126,11 +142,9 @@ class BooksView(QWidget):
 
     def _get_selected(self):
         idx = self.table.currentIndex()
-        if not idx.isValid():
+        if not idx.isValid() or self.model is None:
             return None, None
-        row = idx.row()
-        row_values = self._rows[row]
-        row_dict = {col: row_values[i] for i, col in enumerate(self._columns)}
+        row_dict = self.model.row_dict(idx.row())
         pk_val = row_dict.get(self._pk) if self._pk else None
         return pk_val, row_dict
 
@@ -0,0 +1,147 @@
+"""Background LISTEN on the library change channel (see repos.change_notify).
+
+One listener thread per database keeps its own unpooled connection in
+autocommit mode. Notifications arriving within `BATCH_WINDOW` seconds are
+merged per table and delivered to the GUI thread with the `changes` signal,
+so a burst of edits costs one refetch per open view. After a lost connection
+the listener reconnects and emits `resync`: notifications sent while it was
+down are gone and views have to reload.
+"""
+import logging
+import threading
+from dataclasses import astuple, dataclass, field
+from typing import Dict, Optional, Set
+
+from PySide6.QtCore import QObject, Signal
+
+from ..config import PostgresConfig
+from ..db import get_connection
+from ..repos import change_notify
+
+logger = logging.getLogger(__name__)
+
+# seconds to collect notifications before handing them to the views
+BATCH_WINDOW = 0.2
+# reconnect delay grows up to this many seconds
+MAX_BACKOFF = 30.0
+
+
+@dataclass
+class TableChanges:
+    """Merged changes of one table.
+
+    `reload_ops` lists the operations whose ids were not sent (too many rows,
+    TRUNCATE); for those the view has to reload.
+    """
+
+    inserted: Set = field(default_factory=set)
+    updated: Set = field(default_factory=set)
+    deleted: Set = field(default_factory=set)
+    reload_ops: Set[str] = field(default_factory=set)
+
+    def add(self, change: change_notify.Change) -> None:
+        if change.ids is None:
+            self.reload_ops.add(change.op)
+            return
+        ids = set(change.ids)
+        if change.op == 'INSERT':
+            self.inserted |= ids
+            self.deleted -= ids
+        elif change.op == 'UPDATE':
+            self.updated |= ids - self.inserted
+        elif change.op == 'DELETE':
+            self.deleted |= ids
+            self.inserted -= ids
+            self.updated -= ids
+
+
+class ChangeListener(QObject):
+    # Dict[str, TableChanges], keyed by table name
+    changes = Signal(object)
+    resync = Signal()
+
+    def __init__(self, cfg: PostgresConfig):
+        super().__init__()
+        self.cfg = cfg
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * BATCH_WINDOW + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        backoff = 1.0
+        connected_before = False
+        while not self._stop.is_set():
+            try:
+                conn = get_connection(self.cfg)
+            except Exception as e:
+                logger.info("Change listener: connect failed: %s", type(e).__name__)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            try:
+                conn.autocommit = True
+                conn.execute(f"LISTEN {change_notify.CHANNEL}")
+                backoff = 1.0
+                if connected_before:
+                    self.resync.emit()
+                connected_before = True
+                self._listen(conn)
+            except Exception as e:
+                logger.info("Change listener: connection lost: %s", type(e).__name__)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _listen(self, conn) -> None:
+        pending: Dict[str, TableChanges] = {}
+        while not self._stop.is_set():
+            # waits at most BATCH_WINDOW, so stop() and the batch flush are timely
+            for n in conn.notifies(timeout=BATCH_WINDOW):
+                try:
+                    change = change_notify.parse_payload(n.payload)
+                except Exception:
+                    logger.info("Change listener: bad payload %r", n.payload)
+                    continue
+                pending.setdefault(change.table, TableChanges()).add(change)
+            if pending:
+                self.changes.emit(pending)
+                pending = {}
+
+
+_listeners: Dict[tuple, ChangeListener] = {}
+_listeners_lock = threading.Lock()
+
+
+def get_listener(cfg: PostgresConfig) -> ChangeListener:
+    """Return the process-wide listener for `cfg`, started on first use."""
+    key = astuple(cfg)
+    with _listeners_lock:
+        listener = _listeners.get(key)
+        if listener is None:
+            listener = ChangeListener(cfg)
+            _listeners[key] = listener
+            listener.start()
+        return listener
+
+
+def stop_all_listeners() -> None:
+    with _listeners_lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
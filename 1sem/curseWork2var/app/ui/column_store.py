@@ -0,0 +1,128 @@
+"""Column-wise storage of table rows with lazily cached display strings.
+
+Qt asks a model for the display text of a cell many times (painting, size
+hints, `resizeColumnsToContents`), so the models here format each value once,
+on first access, and keep the string. Columns holding only integers are packed
+into `array('q')`; other columns are plain lists.
+"""
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Sequence
+
+from PySide6.QtCore import QDate, QDateTime, QLocale
+
+_INT_MIN, _INT_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class CellFormatter:
+    """Turns a cell value into display text.
+
+    Without a locale values are shown as `str(value)`. With one, Decimal,
+    float, date and datetime values use its number and short date formats;
+    integers (ids, counts) are left as they are. The C locale has no real
+    date format, so dates stay ISO there.
+    """
+
+    def __init__(self, locale: Optional[QLocale] = None):
+        self.locale = locale
+        self._local_dates = locale is not None and locale.language() != QLocale.C
+
+    def __call__(self, value: Any) -> str:
+        if value is None:
+            return ""
+        loc = self.locale
+        if loc is not None:
+            if isinstance(value, Decimal):
+                exp = value.as_tuple().exponent
+                return loc.toString(float(value), 'f', max(0, -exp) if isinstance(exp, int) else 2)
+            if isinstance(value, float):
+                return loc.toString(value, 'f', 2)
+            if not self._local_dates:
+                return str(value)
+            if isinstance(value, datetime):
+                return loc.toString(QDateTime(value), QLocale.ShortFormat)
+            if isinstance(value, date):
+                return loc.toString(QDate(value.year, value.month, value.day), QLocale.ShortFormat)
+        return str(value)
+
+
+def _packable(values: Sequence) -> bool:
+    return all(type(v) is int and _INT_MIN <= v <= _INT_MAX for v in values)
+
+
+class ColumnStore:
+    """Rows of a fixed number of columns, stored column by column."""
+
+    def __init__(self, width: int, rows: Iterable[Sequence] = (), formatter: Optional[CellFormatter] = None):
+        self._cols: List[Any] = [array('q') for _ in range(width)]
+        # display string per cell, None until first asked for
+        self._text: List[list] = [[] for _ in range(width)]
+        self._len = 0
+        self.formatter = formatter or CellFormatter()
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def width(self) -> int:
+        return len(self._cols)
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        self.insert(self._len, rows)
+
+    def insert(self, pos: int, rows: Iterable[Sequence]) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        for c in range(len(self._cols)):
+            values = [r[c] for r in rows]
+            col = self._cols[c]
+            if isinstance(col, array):
+                if _packable(values):
+                    col[pos:pos] = array('q', values)
+                    self._text[c][pos:pos] = [None] * len(rows)
+                    continue
+                col = self._cols[c] = list(col)
+            col[pos:pos] = values
+            self._text[c][pos:pos] = [None] * len(rows)
+        self._len += len(rows)
+
+    def delete(self, start: int, stop: int) -> None:
+        if stop <= start:
+            return
+        for c in range(len(self._cols)):
+            del self._cols[c][start:stop]
+            del self._text[c][start:stop]
+        self._len -= stop - start
+
+    def set_row(self, i: int, row: Sequence) -> None:
+        for c, v in enumerate(row):
+            col = self._cols[c]
+            if isinstance(col, array) and not _packable((v,)):
+                col = self._cols[c] = list(col)
+            col[i] = v
+            self._text[c][i] = None
+
+    def value(self, r: int, c: int) -> Any:
+        return self._cols[c][r]
+
+    def row(self, r: int) -> tuple:
+        return tuple(col[r] for col in self._cols)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> List[tuple]:
+        if not self._cols:
+            return [()] * (self._len if stop is None else stop - start)
+        return list(zip(*(col[start:stop] for col in self._cols)))
+
+    def column(self, c: int) -> Sequence:
+        """The stored column (read-only use; replaced when its storage type changes)."""
+        return self._cols[c]
+
+    def text(self, r: int, c: int) -> str:
+        cache = self._text[c]
+        s = cache[r]
+        if s is None:
+            s = cache[r] = self.formatter(self._cols[c][r])
+        return s
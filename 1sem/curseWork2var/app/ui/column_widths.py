@@ -0,0 +1,68 @@
+"""Column auto-sizing from a bounded sample of rows.
+
+`QTableView.resizeColumnsToContents` asks the delegate for the size of every
+cell, which is pure text layout on the GUI thread and grows with the table.
+`ColumnAutoSizer` looks at the header plus the first and last rows and a few
+random ones in between, so the cost is fixed, and remembers the widths per
+column set: a refresh of the same view reuses them without measuring.
+"""
+import random
+from typing import Dict, List, Tuple
+
+from PySide6.QtCore import Qt
+
+SAMPLE_HEAD = 50
+SAMPLE_TAIL = 20
+SAMPLE_RANDOM = 80
+# px; longer texts are elided by the view
+MAX_WIDTH = 400
+
+_random = random.Random()
+
+
+def sample_rows(count: int, head: int = SAMPLE_HEAD, tail: int = SAMPLE_TAIL, extra: int = SAMPLE_RANDOM) -> List[int]:
+    """Row numbers to measure: the first `head`, the last `tail` and `extra` random rows in between."""
+    if count <= head + tail + extra:
+        return list(range(count))
+    middle = range(head, count - tail)
+    return [*range(head), *sorted(_random.sample(middle, extra)), *range(count - tail, count)]
+
+
+def estimate_widths(view, rows: List[int]) -> List[int]:
+    """Width per column of the view's model from its header and the given rows (0 for hidden columns)."""
+    model = view.model()
+    header = view.horizontalHeader()
+    widths = []
+    for c in range(model.columnCount()):
+        if view.isColumnHidden(c):
+            widths.append(0)
+            continue
+        w = header.sectionSizeHint(c)
+        for r in rows:
+            w = max(w, view.sizeHintForIndex(model.index(r, c)).width())
+        widths.append(min(w, MAX_WIDTH))
+    return widths
+
+
+class ColumnAutoSizer:
+    """Sizes the columns of one table view, caching the widths per set of column headers."""
+
+    def __init__(self, view):
+        self.view = view
+        self._cache: Dict[Tuple, List[int]] = {}
+
+    def apply(self, force: bool = False) -> None:
+        model = self.view.model()
+        if model is None:
+            return
+        key = tuple(model.headerData(c, Qt.Horizontal) for c in range(model.columnCount()))
+        widths = None if force else self._cache.get(key)
+        if widths is None:
+            widths = estimate_widths(self.view, sample_rows(model.rowCount()))
+            self._cache[key] = widths
+        for c, w in enumerate(widths):
+            if w:
+                self.view.setColumnWidth(c, w)
+
+    def invalidate(self) -> None:
+        self._cache.clear()
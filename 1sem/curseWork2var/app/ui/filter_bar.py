@@ -0,0 +1,142 @@
+"""Per-column filter line and header-click sorting for the list views.
+
+Both only collect the user's choice; the rows are sorted and filtered by the
+server (see `repos.paging.ListQuery`), since the models hold just the loaded
+pages.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import psycopg
+from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtWidgets import QLineEdit, QWidget
+
+from ..repos.paging import ListQuery
+
+# ms of typing pause before the view reloads
+FILTER_DELAY = 300
+
+
+class FilterBar(QWidget):
+    """A row of line edits laid out under the columns of a table view.
+
+    `changed` is emitted once typing pauses for `FILTER_DELAY` ms. Texts are
+    kept by column name, so they survive a reload with the same columns.
+    """
+
+    changed = Signal()
+
+    def __init__(self, table, parent=None):
+        super().__init__(parent)
+        self.table = table
+        self._edits: Dict[str, QLineEdit] = {}
+        self._columns: List[str] = []
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FILTER_DELAY)
+        self._timer.timeout.connect(self.changed)
+        self.setFixedHeight(QLineEdit().sizeHint().height())
+
+        header = table.horizontalHeader()
+        header.sectionResized.connect(self._relayout)
+        header.sectionMoved.connect(self._relayout)
+        header.geometriesChanged.connect(self._relayout)
+        table.horizontalScrollBar().valueChanged.connect(self._relayout)
+
+    def set_columns(self, columns: List[str]) -> None:
+        if list(columns) == self._columns:
+            self._relayout()
+            return
+        old = {name: e.text() for name, e in self._edits.items()}
+        for e in self._edits.values():
+            e.deleteLater()
+        self._edits = {}
+        self._columns = list(columns)
+        for name in self._columns:
+            e = QLineEdit(self)
+            e.setPlaceholderText("фильтр: текст, =, >, <")
+            e.setToolTip(f"Фильтр по столбцу {name}: подстрока или сравнение (=, <>, <, <=, >, >=)")
+            e.setText(old.get(name, ""))
+            e.textChanged.connect(lambda _text: self._timer.start())
+            e.returnPressed.connect(self._apply_now)
+            self._edits[name] = e
+        self._relayout()
+
+    def filters(self) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, e.text().strip()) for name, e in self._edits.items() if e.text().strip())
+
+    def clear(self) -> None:
+        for e in self._edits.values():
+            e.blockSignals(True)
+            e.clear()
+            e.blockSignals(False)
+        self._timer.stop()
+
+    def _apply_now(self):
+        self._timer.stop()
+        self.changed.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._relayout()
+
+    def _relayout(self, *args):
+        header = self.table.horizontalHeader()
+        model = self.table.model()
+        # the header starts after the frame and the row number column
+        offset = self.table.frameWidth() + self.table.verticalHeader().width()
+        for c, name in enumerate(self._columns):
+            e = self._edits[name]
+            if model is None or c >= model.columnCount() or header.isSectionHidden(c):
+                e.hide()
+                continue
+            x = offset + header.sectionViewportPosition(c)
+            e.setGeometry(x, 0, header.sectionSize(c), self.height())
+            e.show()
+
+
+class HeaderSort:
+    """Cycles a column through ascending, descending and unsorted on header clicks."""
+
+    def __init__(self, table, on_change):
+        self.table = table
+        self._on_change = on_change
+        self.sort_col: Optional[str] = None
+        self.descending = False
+        header = table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.sectionClicked.connect(self._on_clicked)
+
+    def _on_clicked(self, section: int):
+        model = self.table.model()
+        if model is None:
+            return
+        name = model.headerData(section, Qt.Horizontal)
+        if name != self.sort_col:
+            self.sort_col, self.descending = name, False
+        elif not self.descending:
+            self.descending = True
+        else:
+            self.sort_col, self.descending = None, False
+        self.show_indicator()
+        self._on_change()
+
+    def show_indicator(self) -> None:
+        """Mark the sort column in the header (again after a new model is set)."""
+        header = self.table.horizontalHeader()
+        model = self.table.model()
+        columns = [model.headerData(c, Qt.Horizontal) for c in range(model.columnCount())] if model is not None else []
+        if self.sort_col in columns:
+            header.setSortIndicatorShown(True)
+            header.setSortIndicator(columns.index(self.sort_col),
+                                    Qt.DescendingOrder if self.descending else Qt.AscendingOrder)
+        else:
+            header.setSortIndicatorShown(False)
+
+
+def list_query(sort: HeaderSort, bar: FilterBar) -> ListQuery:
+    return ListQuery(sort_col=sort.sort_col, descending=sort.descending, filters=bar.filters())
+
+
+def is_filter_error(e: BaseException) -> bool:
+    """True if a load failed because a filter value does not fit the column type (e.g. '> abc' on a date)."""
+    return isinstance(e, psycopg.errors.DataError)
@@ -0,0 +1,357 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from PySide6.QtWidgets import QAbstractItemView
+
+from ..repos.paging import PAGE_SIZE, ListQuery
+from .column_store import ColumnStore
+from .query_runner import QueryRunner
+
+# fetch_page(after=..., before=..., limit=...) -> (columns, rows), pk descending
+FetchPage = Callable[..., Tuple[List[str], List[tuple]]]
+
+# upper bound of rows kept in memory; older pages are dropped from the other end
+MAX_ROWS = 20000
+
+
+def _load_page(fetch_page: FetchPage, generation: int, direction: str, **kwargs) -> Tuple[int, str, List[tuple]]:
+    # worker thread; the generation tells pages fetched for replaced rows apart
+    return generation, direction, fetch_page(**kwargs)[1]
+
+
+class KeysetTableModel(QAbstractTableModel):
+    """Lazily fetched table model on top of keyset pagination.
+
+    Rows are pulled page by page through `canFetchMore`/`fetchMore` while the
+    view scrolls down. At most `max_rows` rows are kept: when the window is
+    full the top pages are dropped and can be fetched back with
+    `fetch_previous()` (see `connect_top_prefetch`).
+
+    `query` is the server-side sort/filter the pages were fetched with; when
+    it sorts, page cursors are (sort value, pk) pairs instead of the pk.
+
+    Pages are fetched on a worker thread (`pages`, a QueryRunner), one at a
+    time: `canFetchMore` is False while a page is on its way. A failed fetch
+    stops fetching in that direction and is reported through `fetch_failed`.
+    """
+
+    fetch_failed = Signal(object)
+
+    def __init__(self, fetch_page: FetchPage, pk_col: Optional[str], page_size: int = PAGE_SIZE, max_rows: int = MAX_ROWS,
+                 query: Optional[ListQuery] = None):
+        super().__init__()
+        self._fetch_page = fetch_page
+        self._pk_col = pk_col
+        self.query = query or ListQuery()
+        self._page_size = page_size
+        self._max_rows = max(max_rows, page_size * 2)
+        self._columns: List[str] = []
+        self._store = ColumnStore(0)
+        self._pk_index: Optional[int] = None
+        self._sort_index: Optional[int] = None
+        self._has_more = False
+        self._has_previous = False
+        # bumped whenever the loaded rows are replaced; older pages are dropped
+        self._generation = 0
+        self._fetching = False
+        self._on_previous: Optional[Callable[[int], None]] = None
+        self.pages = QueryRunner(self)
+        self.pages.finished.connect(self._on_page)
+        self.pages.failed.connect(self._on_page_failed)
+
+    def set_first_page(self, cols: List[str], rows: List[tuple]) -> None:
+        """Reset the model to a first page fetched elsewhere (on the view's worker thread)."""
+        self.beginResetModel()
+        self._columns = list(cols)
+        self._store = ColumnStore(len(self._columns), rows)
+        self._pk_index = self._columns.index(self._pk_col) if self._pk_col in self._columns else None
+        self._sort_index = self._columns.index(self.query.sort_col) if self.query.sort_col in self._columns else None
+        # without a pk the repo returns everything at once
+        self._has_more = self._pk_index is not None and len(rows) >= self._page_size
+        self._has_previous = False
+        self._new_generation()
+        self.endResetModel()
+
+    def refresh_limit(self) -> int:
+        """Rows a refresh should request so that it covers the loaded window (see merge_first_page)."""
+        if self._has_previous or self._pk_index is None:
+            return self._page_size
+        return min(max(self._page_size, len(self._store)), self._max_rows)
+
+    def merge_first_page(self, cols: List[str], rows: List[tuple], limit: int) -> bool:
+        """Apply a refreshed first page of `limit` rows as a diff by primary key.
+
+        Unchanged rows are left alone, so selection, scroll position and column
+        widths survive; only removed, inserted and changed rows are signalled.
+        Returns False (and does nothing) if the columns differ and the caller
+        has to build a new model.
+        """
+        if list(cols) != self._columns or self._pk_index is None:
+            return False
+        pki = self._pk_index
+        last_col = len(self._columns) - 1
+        store = self._store
+        if not self._ordered_by_pk():
+            self._merge_sorted(rows, limit)
+            return True
+        i = j = 0
+        while j < len(rows):
+            new_pk = rows[j][pki]
+            if i < len(store):
+                old_pk = store.value(i, pki)
+                if old_pk == new_pk:
+                    if store.row(i) != tuple(rows[j]):
+                        store.set_row(i, rows[j])
+                        self.dataChanged.emit(self.index(i, 0), self.index(i, last_col))
+                    i += 1
+                    j += 1
+                    continue
+                if old_pk > new_pk:
+                    # both sides are pk descending: old keys above new_pk are gone
+                    k = i
+                    while k < len(store) and store.value(k, pki) > new_pk:
+                        k += 1
+                    self.beginRemoveRows(QModelIndex(), i, k - 1)
+                    store.delete(i, k)
+                    self.endRemoveRows()
+                    continue
+            # run of new keys above the next old key
+            bound = store.value(i, pki) if i < len(store) else None
+            k = j
+            while k < len(rows) and (bound is None or rows[k][pki] > bound):
+                k += 1
+            self.beginInsertRows(QModelIndex(), i, i + k - j - 1)
+            store.insert(i, rows[j:k])
+            self.endInsertRows()
+            i += k - j
+            j = k
+        if i < len(store):
+            # rows below the refreshed window come back with fetchMore
+            self.beginRemoveRows(QModelIndex(), i, len(store) - 1)
+            store.delete(i, len(store))
+            self.endRemoveRows()
+        self._has_more = len(rows) >= limit
+        self._has_previous = False
+        self._new_generation()
+        return True
+
+    def _ordered_by_pk(self) -> bool:
+        return self.query.sort_col is None
+
+    def _merge_sorted(self, rows: List[tuple], limit: int) -> None:
+        # a sorted page has no pk order to walk: keep the rows if the keys and
+        # their order are unchanged, otherwise reset
+        store = self._store
+        pki = self._pk_index
+        if len(rows) == len(store) and all(store.value(i, pki) == r[pki] for i, r in enumerate(rows)):
+            last_col = len(self._columns) - 1
+            for i, row in enumerate(rows):
+                if store.row(i) != tuple(row):
+                    store.set_row(i, row)
+                    self.dataChanged.emit(self.index(i, 0), self.index(i, last_col))
+        else:
+            self.beginResetModel()
+            self._store = ColumnStore(len(self._columns), rows)
+            self.endResetModel()
+        self._has_more = len(rows) >= limit
+        self._has_previous = False
+        self._new_generation()
+
+    def _new_generation(self) -> None:
+        self._generation += 1
+        self._fetching = False
+        self._on_previous = None
+
+    def _cursor(self, row: int):
+        pk = self._store.value(row, self._pk_index)
+        if self._sort_index is None:
+            return pk
+        return (self._store.value(row, self._sort_index), pk)
+
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def row_dict(self, row: int) -> Dict:
+        return dict(zip(self._columns, self._store.row(row)))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._store)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            # formatted once per cell, see ColumnStore.text
+            return self._store.text(index.row(), index.column())
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._columns[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._has_more and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        store = self._store
+        if parent.isValid() or not self._has_more or self._fetching or not len(store):
+            return
+        self._fetching = True
+        self.pages.run(_load_page, self._fetch_page, self._generation, 'more',
+                       after=self._cursor(len(store) - 1), limit=self._page_size)
+
+    def _on_page(self, result) -> None:
+        generation, direction, rows = result
+        if generation != self._generation:
+            return
+        self._fetching = False
+        if direction == 'more':
+            self._append_page(rows)
+        else:
+            done, self._on_previous = self._on_previous, None
+            inserted = self._prepend_page(rows)
+            if done is not None:
+                done(inserted)
+
+    def _on_page_failed(self, e) -> None:
+        if not self._fetching:
+            # failed for rows that were replaced meanwhile
+            return
+        self._fetching = False
+        self._on_previous = None
+        # no retry on every scroll; the next reload fetches again
+        self._has_more = False
+        self._has_previous = False
+        self.fetch_failed.emit(e)
+
+    def _append_page(self, rows: List[tuple]) -> None:
+        store = self._store
+        self._has_more = len(rows) >= self._page_size
+        if rows:
+            start = len(store)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            store.extend(rows)
+            self.endInsertRows()
+        overflow = len(store) - self._max_rows
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            store.delete(0, overflow)
+            self.endRemoveRows()
+            self._has_previous = True
+
+    def can_fetch_previous(self) -> bool:
+        return self._has_previous and not self._fetching
+
+    def fetch_previous(self, done: Optional[Callable[[int], None]] = None) -> None:
+        """Re-fetch the page above the first loaded row in the background.
+
+        `done(inserted)` is called with the number of rows put on top.
+        """
+        store = self._store
+        if not self._has_previous or self._fetching or not len(store):
+            return
+        self._fetching = True
+        self._on_previous = done
+        self.pages.run(_load_page, self._fetch_page, self._generation, 'previous',
+                       before=self._cursor(0), limit=self._page_size)
+
+    def _prepend_page(self, rows: List[tuple]) -> int:
+        store = self._store
+        self._has_previous = len(rows) >= self._page_size
+        if rows:
+            self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+            store.insert(0, rows)
+            self.endInsertRows()
+        overflow = len(store) - self._max_rows
+        if overflow > 0:
+            keep = len(store) - overflow
+            self.beginRemoveRows(QModelIndex(), keep, len(store) - 1)
+            store.delete(keep, len(store))
+            self.endRemoveRows()
+            self._has_more = True
+        return len(rows)
+
+    def pks_where(self, column: str, values: Set) -> Set:
+        """Primary keys of loaded rows whose `column` value is in `values`."""
+        if self._pk_index is None or column not in self._columns:
+            return set()
+        col = self._store.column(self._columns.index(column))
+        pks = self._store.column(self._pk_index)
+        return {pks[i] for i, v in enumerate(col) if v in values}
+
+    def apply_changes(self, rows: List[tuple], removed: Iterable = ()) -> None:
+        """Merge refetched rows and drop deleted keys without a reset.
+
+        Known keys are updated in place (`dataChanged`). New keys are inserted
+        at their pk position only if it lies inside the loaded window; rows
+        below it arrive with the next `fetchMore` anyway. In a sorted model new
+        keys wait for the next refresh.
+        """
+        pki = self._pk_index
+        if pki is None:
+            return
+        store = self._store
+        removed = set(removed)
+        if removed:
+            # bottom-up so the remaining positions stay valid
+            gone = [i for i, pk in enumerate(store.column(pki)) if pk in removed]
+            for i in reversed(gone):
+                self.beginRemoveRows(QModelIndex(), i, i)
+                store.delete(i, i + 1)
+                self.endRemoveRows()
+        if not rows:
+            return
+        pos = {pk: i for i, pk in enumerate(store.column(pki))}
+        last_col = len(self._columns) - 1
+        new_rows = []
+        for row in rows:
+            i = pos.get(row[pki])
+            if i is None:
+                new_rows.append(row)
+                continue
+            store.set_row(i, row)
+            self.dataChanged.emit(self.index(i, 0), self.index(i, last_col))
+        if not self._ordered_by_pk():
+            return
+        for row in new_rows:
+            pk = row[pki]
+            if len(store):
+                above = self._has_previous and pk > store.value(0, pki)
+                below = self._has_more and pk < store.value(len(store) - 1, pki)
+                if above or below:
+                    continue
+            # rows are ordered by pk descending
+            i = bisect_left(store.column(pki), -pk, key=lambda v: -v)
+            self.beginInsertRows(QModelIndex(), i, i)
+            store.insert(i, [row])
+            self.endInsertRows()
+
+
+def connect_top_prefetch(table) -> None:
+    """Fetch dropped rows back when the table view is scrolled to the very top."""
+    sb = table.verticalScrollBar()
+
+    def on_scroll(value):
+        model = table.model()
+        if value == sb.minimum() and isinstance(model, KeysetTableModel) and model.can_fetch_previous():
+            model.fetch_previous(lambda inserted: keep_position(model, inserted))
+
+    def keep_position(model, inserted):
+        if inserted and table.model() is model:
+            # keep the previously first row in place instead of jumping to the new top
+            table.scrollTo(model.index(inserted, 0), QAbstractItemView.PositionAtTop)
+
+    sb.valueChanged.connect(on_scroll)
@@ -1,3 +1,4 @@
+from functools import partial
 from typing import List, Dict, Optional
 from datetime import date, timedelta
 
@@ -9,7 +10,6 @@ from PySide6.QtWidgets import (
     QMessageBox,
     QVBoxLayout,
     QPushButton,
-    QComboBox,
 )
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QApplication
@@ -17,6 +17,7 @@ import traceback
 
 from ..config import PostgresConfig
 from ..repos import journal_repo, clients_repo, books_repo, book_types_repo
+from .search_box import SearchBox
 
 
 class LoanForm(QDialog):
@@ -48,96 +49,34 @@ class LoanForm(QDialog):
         self.form = QFormLayout()
         self.widgets = {}
 
-        # prepare clients and books lists
-        try:
-            ccols, crows = clients_repo.list_rows(self.cfg)
-            client_cols = ccols
-            clients = crows
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Не удалось загрузить список клиентов: {type(e).__name__}: {e}')
-            client_cols = []
-            clients = []
-
-        try:
-            bcols, brows = books_repo.list_rows(self.cfg)
-            book_cols = bcols
-            books = brows
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Не удалось загрузить список книг: {type(e).__name__}: {e}')
-            book_cols = []
-            books = []
-
-        # store for later lookups
-        self._book_cols = book_cols
-        self._book_rows = books
-
-        # map client id -> display
-        self.client_map = {}
-        if client_cols:
-            id_index = client_cols.index('id') if 'id' in client_cols else 0
-            disp_col = None
-            for cand in ('name', 'fio', 'full_name', 'email'):
-                if cand in client_cols:
-                    disp_col = cand
-                    break
-            disp_index = client_cols.index(disp_col) if disp_col in client_cols else (1 if len(client_cols) > 1 else id_index)
-            for r in clients:
-                cid = r[id_index]
-                self.client_map[cid] = str(r[disp_index])
-
-        # map book id -> title display and availability
-        self.book_map = {}
-        if book_cols:
-            id_index_b = book_cols.index('id') if 'id' in book_cols else 0
-            title_index = id_index_b
-            for cand in ('title', 'name'):
-                if cand in book_cols:
-                    title_index = book_cols.index(cand)
-                    break
-            for r in books:
-                bid = r[id_index_b]
-                title = str(r[title_index])
-                try:
-                    avail = journal_repo.is_book_available(self.cfg, self.table, bid)
-                except Exception:
-                    avail = True
-                self.book_map[bid] = (title, avail)
-
-        # Build form fields
-        cb_client = QComboBox()
-        cb_client.addItem('', None)
-        for cid, disp in self.client_map.items():
-            cb_client.addItem(disp, cid)
-        if self.initial_row:
-            cur = self._row_get('client_id')
-            if cur is not None:
-                idx = cb_client.findData(cur)
-                if idx >= 0:
-                    cb_client.setCurrentIndex(idx)
+        # clients and books are searched on the server as the user types
+        # (see repos.text_search) instead of being loaded into the dialog
+        cb_client = SearchBox(partial(clients_repo.search, self.cfg))
+        cur = self._row_get('client_id') if self.initial_row else None
+        if cur is not None:
+            try:
+                hits = clients_repo.lookup(self.cfg, [cur])
+            except Exception:
+                hits = []
+            cb_client.set_current(hits[0] if hits else {'id': cur, 'label': str(cur)})
 
         self.widgets['client_id'] = cb_client
         self.form.addRow(QLabel('Клиент'), cb_client)
 
-        cb_book = QComboBox()
-        cb_book.addItem('', None)
-        for bid, (title, avail) in self.book_map.items():
-            disp = f"{title} ({'доступна' if avail else 'выдана'})"
-            cb_book.addItem(disp, bid)
-        if self.initial_row:
-            cur = self._row_get('book_id')
-            if cur is not None:
-                idx = cb_book.findData(cur)
-                if idx >= 0:
-                    cb_book.setCurrentIndex(idx)
+        cb_book = SearchBox(self._search_books)
+        cur = self._row_get('book_id') if self.initial_row else None
+        if cur is not None:
+            try:
+                hits = self._with_availability(books_repo.lookup(self.cfg, [cur]))
+            except Exception:
+                hits = []
+            cb_book.set_current(hits[0] if hits else {'id': cur, 'label': str(cur), 'type_id': None})
 
         self.widgets['book_id'] = cb_book
         self.form.addRow(QLabel('Книга'), cb_book)
 
         # when book selection changes, try to recalc due date
-        try:
-            cb_book.currentIndexChanged.connect(self._on_book_changed)
-        except Exception:
-            pass
+        cb_book.selection_changed.connect(self._on_book_changed)
 
         issued_le = QLineEdit()
         issued_val = self._row_get('issued_at')
@@ -235,13 +174,6 @@ class LoanForm(QDialog):
             if client_id is None or book_id is None:
                 QMessageBox.warning(self, 'Ошибка', 'Выберите клиента и книгу')
                 return
-            cnt = journal_repo.count_active_loans_for_client(self.cfg, self.table, client_id)
-            if cnt >= 10:
-                QMessageBox.warning(self, 'Отказ', 'У клиента уже 10 активных выдач')
-                return
-            if not journal_repo.is_book_available(self.cfg, self.table, book_id):
-                QMessageBox.warning(self, 'Отказ', 'Книга уже выдана')
-                return
             # use due_at from widget (computed or user-provided)
             due_text = self.widgets['due_at'].text().strip()
             if not due_text:
@@ -260,7 +192,14 @@ class LoanForm(QDialog):
             except Exception:
                 issued = date.today()
 
-            journal_repo.issue_book(self.cfg, self.table, client_id, book_id, issued, due)
+            # limit and availability are checked by the same statement that inserts the loan
+            result = journal_repo.issue_book_checked(self.cfg, self.table, client_id, book_id, issued, due)
+            if result.status == journal_repo.CLIENT_OVER_LIMIT:
+                QMessageBox.warning(self, 'Отказ', f'У клиента уже {journal_repo.MAX_ACTIVE_LOANS} активных выдач')
+                return
+            if result.status == journal_repo.BOOK_ON_HAND:
+                QMessageBox.warning(self, 'Отказ', 'Книга уже выдана')
+                return
             QMessageBox.information(self, 'OK', 'Книга выдана')
             self.accept()
         except Exception as e:
@@ -310,19 +249,10 @@ class LoanForm(QDialog):
                         # determine rate: prefer journal bt_fine, then book_types fine
                         rate = float(self._row_get('bt_fine') or 0)
                         if rate == 0:
-                            # try to find type_id from cached book rows
+                            # type of the loan's book, shown in the book field
                             try:
-                                bcols = getattr(self, '_book_cols', [])
-                                brows = getattr(self, '_book_rows', [])
-                                bid_idx = bcols.index('id') if 'id' in bcols else 0
-                                type_idx = bcols.index('type_id') if 'type_id' in bcols else None
-                                book_id = self._row_get('book_id')
-                                type_id = None
-                                if book_id is not None and type_idx is not None:
-                                    for r in brows:
-                                        if r[bid_idx] == book_id:
-                                            type_id = r[type_idx]
-                                            break
+                                hit = self.widgets['book_id'].current_hit()
+                                type_id = hit.get('type_id') if hit else None
                                 if type_id is not None:
                                     t = self._book_types.get(type_id) if getattr(self, '_book_types', None) else None
                                     if not t:
@@ -383,17 +313,9 @@ class LoanForm(QDialog):
                             pass
                 return
 
-            # find book row
-            bcols = getattr(self, '_book_cols', [])
-            brows = getattr(self, '_book_rows', [])
-            bid_idx = bcols.index('id') if 'id' in bcols else 0
-            type_idx = bcols.index('type_id') if 'type_id' in bcols else None
-            btype = None
-            for r in brows:
-                if r[bid_idx] == book_id:
-                    if type_idx is not None:
-                        btype = r[type_idx]
-                    break
+            # the search hit carries the book type
+            hit = cb.current_hit()
+            btype = hit.get('type_id') if hit else None
 
             day_count = None
             if btype is not None:
@@ -461,6 +383,21 @@ class LoanForm(QDialog):
         except Exception:
             return
 
+    def _search_books(self, text: str) -> List[Dict]:
+        # runs on the search box's worker thread
+        return self._with_availability(books_repo.search(self.cfg, text))
+
+    def _with_availability(self, hits: List[Dict]) -> List[Dict]:
+        """Add the on-hand state to book hits, with one query for all of them."""
+        try:
+            avail_map = journal_repo.availability_map(self.cfg, self.table, [h['id'] for h in hits])
+        except Exception:
+            avail_map = {}
+        for h in hits:
+            avail = avail_map.get(h['id'], True)
+            h['label'] = f"{h['label']} ({'доступна' if avail else 'выдана'})"
+        return hits
+
     # helpers to adapt to journal column naming
     def _jr(self, key: str) -> Optional[str]:
         """Return real column name for logical journal key, or None."""
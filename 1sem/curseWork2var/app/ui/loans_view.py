@@ -1,5 +1,5 @@
-from typing import List
 from datetime import date
+from functools import partial
 
 from PySide6.QtWidgets import (
     QWidget,
@@ -8,41 +8,20 @@ from PySide6.QtWidgets import (
     QPushButton,
     QTableView,
     QMessageBox,
+    QAbstractItemView,
+    QInputDialog,
 )
 from PySide6.QtWidgets import QSizePolicy
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
 
 from ..config import PostgresConfig
-from ..repos import journal_repo
+from ..repos import change_notify, journal_repo
+from ..repos.paging import PAGE_SIZE
+from .change_listener import get_listener
+from .column_widths import ColumnAutoSizer
+from .filter_bar import FilterBar, HeaderSort, is_filter_error, list_query
 from .loan_form import LoanForm
-
-
-class LoansTableModel(QAbstractTableModel):
-    def __init__(self, columns: List[str], rows: List[tuple]):
-        super().__init__()
-        self._columns = columns
-        self._rows = rows
-
-    def rowCount(self, parent=QModelIndex()):
-        return len(self._rows)
-
-    def columnCount(self, parent=QModelIndex()):
-        return len(self._columns)
-
-    def data(self, index: QModelIndex, role=Qt.DisplayRole):
-        if not index.isValid():
-            return None
-        if role in (Qt.DisplayRole, Qt.EditRole):
-            val = self._rows[index.row()][index.column()]
-            return "" if val is None else str(val)
-        return None
-
-    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
-        if role != Qt.DisplayRole:
-            return None
-        if orientation == Qt.Horizontal:
-            return self._columns[section]
-        return section + 1
+from .keyset_model import KeysetTableModel, connect_top_prefetch
+from .query_runner import QueryRunner, LoadingIndicator
 
 
 class LoansView(QWidget):
@@ -55,7 +34,16 @@ class LoansView(QWidget):
         self.resize(1000, 500)
 
         self.table = QTableView()
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.table)
         self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # sorting and filtering run on the server, see repos.paging.ListQuery
+        self.filter_bar = FilterBar(self.table)
+        self._sort = HeaderSort(self.table, self.load_data)
+        self.filter_bar.changed.connect(self.load_data)
+        # several rows can be selected for a batch return
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
         self.btn_refresh = QPushButton("Обновить")
         self.btn_open = QPushButton("Открыть")
@@ -63,8 +51,13 @@ class LoansView(QWidget):
         self.btn_return = QPushButton("Принять")
         self.btn_delete = QPushButton("Удалить")
 
+        self._runner = QueryRunner(self)
+        self._runner.finished.connect(self._on_loaded)
+        self._runner.failed.connect(self._on_load_failed)
+
         btn_layout = QHBoxLayout()
         btn_layout.addWidget(self.btn_refresh)
+        btn_layout.addWidget(LoadingIndicator(self._runner))
         btn_layout.addStretch()
         btn_layout.addWidget(self.btn_open)
         btn_layout.addWidget(self.btn_issue)
@@ -72,6 +65,7 @@ class LoansView(QWidget):
         btn_layout.addWidget(self.btn_delete)
 
         main_layout = QVBoxLayout(self)
+        main_layout.addWidget(self.filter_bar)
         main_layout.addWidget(self.table)
         main_layout.addLayout(btn_layout)
 
@@ -90,26 +84,124 @@ class LoansView(QWidget):
         self._table = journal_repo.detect_journal_table(self.cfg)
         self._pk = journal_repo.get_pk(self.cfg, self._table)
 
+        connect_top_prefetch(self.table)
+
+        self.model = None
         self._columns = []
-        self._rows = []
+
+        # live updates: rows changed at other desks are refetched one by one
+        # (see repos.change_notify); without the triggers the view reloads after edits
+        self._colmap = journal_repo.get_journal_colmap(self.cfg, self._table)
+        self._pending_sync = set()
+        self._syncing = set()
+        self._sync_runner = QueryRunner(self)
+        self._sync_runner.finished.connect(self._on_synced)
+        self._sync_runner.failed.connect(self._on_sync_failed)
+        # batch returns (see on_return_batch)
+        self._return_runner = QueryRunner(self)
+        self._return_runner.finished.connect(self._on_returned)
+        self._return_runner.failed.connect(self._on_return_failed)
+        try:
+            self._live = bool(self._pk) and change_notify.is_installed(self.cfg)
+        except Exception:
+            self._live = False
+        if self._live:
+            listener = get_listener(self.cfg)
+            listener.changes.connect(self._on_db_changes)
+            listener.resync.connect(self.load_data)
+
         self.load_data()
 
     def load_data(self):
-        try:
-            self._columns, self._rows = journal_repo.list_rows_joined(self.cfg, self._table)
-            self.model = LoansTableModel(self._columns, self._rows)
-            self.table.setModel(self.model)
-            self.table.resizeColumnsToContents()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить журнал: {type(e).__name__}")
+        # the first page is fetched on a worker thread, see _on_loaded; a refresh
+        # re-reads the whole loaded window so that it can be merged as a diff
+        query = list_query(self._sort, self.filter_bar)
+        same_query = self.model is not None and self.model.query == query
+        limit = self.model.refresh_limit() if same_query else PAGE_SIZE
+        self._runner.run(self._query, limit, query)
+
+    def _query(self, limit, query):
+        cols, rows = journal_repo.list_page(self.cfg, self._table, limit=limit, query=query)
+        return limit, query, cols, rows
+
+    def _on_load_failed(self, e):
+        if is_filter_error(e):
+            QMessageBox.warning(self, "Ошибка", "Значение фильтра не подходит к типу столбца")
+            return
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить журнал: {type(e).__name__}")
+
+    def _on_loaded(self, result):
+        limit, query, cols, rows = result
+        if self.model is not None and self.model.query == query and self.model.merge_first_page(cols, rows, limit):
+            return
+        # further rows are pulled page by page as the table scrolls
+        self.model = KeysetTableModel(partial(journal_repo.list_page, self.cfg, self._table, query=query), self._pk, query=query)
+        self.model.fetch_failed.connect(self._on_load_failed)
+        self.model.set_first_page(cols, rows)
+        self._columns = self.model.columns()
+        self.table.setModel(self.model)
+        self._sizer.apply()
+        self.filter_bar.set_columns(self._columns)
+        self._sort.show_indicator()
+
+    def _refresh_after_edit(self):
+        # with live updates the change notification refreshes the touched rows
+        if not self._live:
+            self.load_data()
+
+    def _on_db_changes(self, changes):
+        if self.model is None:
+            return
+        journal = changes.get(self._table)
+        if journal is not None:
+            if journal.reload_ops:
+                self.load_data()
+                return
+            self.model.apply_changes([], journal.deleted)
+            self._pending_sync |= journal.inserted | journal.updated
+        # client and book names in the rows come from the referenced tables;
+        # new clients/books cannot be referenced by loaded rows yet
+        for ref_table, logical in (('clients', 'client_id'), ('books', 'book_id')):
+            ref = changes.get(ref_table)
+            col = self._colmap.get(logical)
+            if ref is None or not col:
+                continue
+            if ref.reload_ops - {'INSERT'}:
+                self.load_data()
+                return
+            self._pending_sync |= self.model.pks_where(col, ref.updated | ref.deleted)
+        self._start_sync()
+
+    def _start_sync(self):
+        if self._sync_runner.is_busy() or not self._pending_sync:
+            return
+        self._syncing, self._pending_sync = self._pending_sync, set()
+        # rows no longer matching the view's filters come back missing and are dropped
+        query = self.model.query if self.model is not None else None
+        self._sync_runner.run(journal_repo.rows_by_pk, self.cfg, self._table, list(self._syncing), query)
+
+    def _on_synced(self, result):
+        cols, rows = result
+        if self.model is not None:
+            if cols != self.model.columns():
+                # schema changed under us
+                self.load_data()
+            else:
+                pki = cols.index(self._pk)
+                found = {r[pki] for r in rows}
+                self.model.apply_changes(rows, self._syncing - found)
+        self._syncing = set()
+        self._start_sync()
+
+    def _on_sync_failed(self, e):
+        self._syncing = set()
+        self.load_data()
 
     def _get_selected(self):
         idx = self.table.currentIndex()
-        if not idx.isValid():
+        if not idx.isValid() or self.model is None:
             return None, None
-        row = idx.row()
-        row_values = self._rows[row]
-        row_dict = {col: row_values[i] for i, col in enumerate(self._columns)}
+        row_dict = self.model.row_dict(idx.row())
         pk_val = row_dict.get(self._pk) if self._pk else None
         return pk_val, row_dict
 
@@ -123,14 +215,18 @@ class LoansView(QWidget):
             return
         dlg = LoanForm(self.cfg, self.role, self._table, journal_repo.get_columns(self.cfg, self._table), self._pk, row, mode='view', parent=self)
         dlg.exec()
-        self.load_data()
+        self._refresh_after_edit()
 
     def on_issue(self):
         dlg = LoanForm(self.cfg, self.role, self._table, journal_repo.get_columns(self.cfg, self._table), self._pk, None, mode='issue', parent=self)
         if dlg.exec() == 1:
-            self.load_data()
+            self._refresh_after_edit()
 
     def on_return(self):
+        selected = self.table.selectionModel().selectedRows() if self.table.selectionModel() else []
+        if len(selected) > 1:
+            self.on_return_batch(sorted(i.row() for i in selected))
+            return
         pk, row = self._get_selected()
         if row is None:
             QMessageBox.information(self, "Инфо", "Выберите запись")
@@ -144,7 +240,51 @@ class LoansView(QWidget):
             return
         dlg = LoanForm(self.cfg, self.role, self._table, journal_repo.get_columns(self.cfg, self._table), self._pk, row, mode='return', parent=self)
         if dlg.exec() == 1:
-            self.load_data()
+            self._refresh_after_edit()
+
+    def on_return_batch(self, rows):
+        if not self._pk:
+            QMessageBox.warning(self, "Ошибка", "В таблице журнала нет первичного ключа")
+            return
+        if self._return_runner.is_busy():
+            # a second run would be coalesced with the first and its report lost
+            QMessageBox.information(self, "Инфо", "Предыдущий приём книг ещё выполняется")
+            return
+        ids = [self.model.row_dict(r).get(self._pk) for r in rows]
+        text, ok = QInputDialog.getText(self, "Приём книг", f"Дата возврата для {len(ids)} записей:", text=str(date.today()))
+        if not ok:
+            return
+        try:
+            returned = date.fromisoformat(text.strip())
+        except Exception:
+            QMessageBox.warning(self, "Ошибка", "Неверный формат даты возврата")
+            return
+        self._return_runner.run(journal_repo.return_books, self.cfg, self._table, ids, returned)
+
+    def _on_return_failed(self, e):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось принять книги: {type(e).__name__}")
+
+    def _on_returned(self, outcomes):
+        labels = {
+            journal_repo.RETURNED: "принята",
+            journal_repo.ALREADY_RETURNED: "уже возвращена",
+            journal_repo.NOT_FOUND: "запись не найдена",
+            journal_repo.BEFORE_ISSUE: "дата возврата раньше даты выдачи",
+        }
+        lines = []
+        for o in outcomes:
+            line = f"{o.journal_id}: {labels.get(o.status, o.status)}"
+            if o.status == journal_repo.RETURNED and o.days_overdue > 0:
+                line += f", просрочка {o.days_overdue} дн., штраф {o.fine_amount:g}"
+            lines.append(line)
+        done = sum(1 for o in outcomes if o.status == journal_repo.RETURNED)
+        total_fine = sum(o.fine_amount for o in outcomes)
+        box = QMessageBox(self)
+        box.setWindowTitle("Приём книг")
+        box.setText(f"Принято: {done} из {len(outcomes)}. Сумма штрафов: {total_fine:g}")
+        box.setDetailedText("\n".join(lines))
+        box.exec()
+        self._refresh_after_edit()
 
     def on_delete(self):
         pk, row = self._get_selected()
@@ -159,6 +299,6 @@ class LoansView(QWidget):
             return
         try:
             journal_repo.delete_row(self.cfg, self._table, self._pk, pk)
-            self.load_data()
+            self._refresh_after_edit()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось удалить запись: {type(e).__name__}")
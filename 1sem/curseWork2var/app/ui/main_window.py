@@ -1,6 +1,7 @@
+from functools import partial
 from typing import Dict
 
-from PySide6.QtWidgets import QMainWindow, QStackedWidget
+from PySide6.QtWidgets import QFileDialog, QMainWindow, QMessageBox, QStackedWidget
 from PySide6.QtGui import QAction
 
 
@@ -52,6 +53,40 @@ class MainWindow(QMainWindow):
 
         # Do not disable whole СПРАВОЧНИКИ menu; CRUD restrictions handled in views/forms
 
+        # database maintenance, admin only
+        if self.role == "admin":
+            self.service_menu = menubar.addMenu("СЕРВИС")
+
+            summary_on_action = QAction("Сводка для отчётов: включить/пересобрать", self)
+            summary_on_action.triggered.connect(self.install_report_summary)
+            self.service_menu.addAction(summary_on_action)
+
+            summary_off_action = QAction("Сводка для отчётов: отключить", self)
+            summary_off_action.triggered.connect(self.uninstall_report_summary)
+            self.service_menu.addAction(summary_off_action)
+
+            live_on_action = QAction("Автообновление журнала: включить", self)
+            live_on_action.triggered.connect(self.install_change_notify)
+            self.service_menu.addAction(live_on_action)
+
+            live_off_action = QAction("Автообновление журнала: отключить", self)
+            live_off_action.triggered.connect(self.uninstall_change_notify)
+            self.service_menu.addAction(live_off_action)
+
+            indexes_action = QAction("Индексы журнала", self)
+            indexes_action.triggered.connect(self.create_journal_indexes)
+            self.service_menu.addAction(indexes_action)
+
+            search_indexes_action = QAction("Индексы поиска клиентов и книг (pg_trgm)", self)
+            search_indexes_action.triggered.connect(self.create_search_indexes)
+            self.service_menu.addAction(search_indexes_action)
+
+            self.service_menu.addSeparator()
+            for table, title in (("clients", "Импорт клиентов из CSV…"), ("books", "Импорт книг из CSV…")):
+                import_action = QAction(title, self)
+                import_action.triggered.connect(partial(self.bulk_import, table))
+                self.service_menu.addAction(import_action)
+
     def _init_status(self):
         if self.username and self.role:
             if self.role == "admin":
@@ -136,3 +171,98 @@ class MainWindow(QMainWindow):
             self.setWindowTitle(f"Library — {view.windowTitle()}")
         except Exception as e:
             self.statusBar().showMessage(f"Не удалось открыть отчёт: {type(e).__name__}")
+
+    def install_report_summary(self):
+        try:
+            from ..repos import report_summary
+
+            rows = report_summary.install(self.cfg)
+            QMessageBox.information(self, "Сводка для отчётов", f"Сводка создана, строк: {rows}. Отчёты читают данные из неё.")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать сводку: {type(e).__name__}")
+
+    def uninstall_report_summary(self):
+        try:
+            from ..repos import report_summary
+
+            report_summary.uninstall(self.cfg)
+            QMessageBox.information(self, "Сводка для отчётов", "Сводка удалена. Отчёты строятся по журналу.")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить сводку: {type(e).__name__}")
+
+    def install_change_notify(self):
+        try:
+            from ..repos import change_notify
+
+            tables = change_notify.install(self.cfg)
+            QMessageBox.information(
+                self,
+                "Автообновление журнала",
+                f"Уведомления включены для таблиц: {', '.join(tables)}. Заново открытые окна выдач обновляются сами.",
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось включить уведомления: {type(e).__name__}")
+
+    def uninstall_change_notify(self):
+        try:
+            from ..repos import change_notify
+
+            change_notify.uninstall(self.cfg)
+            QMessageBox.information(self, "Автообновление журнала", "Уведомления отключены. Журнал обновляется кнопкой «Обновить».")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось отключить уведомления: {type(e).__name__}")
+
+    def create_journal_indexes(self):
+        try:
+            from ..repos import index_advisor
+
+            missing = index_advisor.missing_indexes(self.cfg)
+            if not missing:
+                QMessageBox.information(self, "Индексы журнала", "Все рекомендуемые индексы уже есть.")
+                return
+            lines = "\n".join(f"- {adv.name}: {adv.reason}" for adv in missing)
+            ans = QMessageBox.question(
+                self,
+                "Индексы журнала",
+                f"Отсутствуют индексы:\n{lines}\n\nСоздать их (CONCURRENTLY, без блокировки журнала)?",
+            )
+            if ans != QMessageBox.Yes:
+                return
+            created = index_advisor.create_indexes(self.cfg, missing)
+            QMessageBox.information(self, "Индексы журнала", f"Создано индексов: {len(created)}")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать индексы: {type(e).__name__}")
+
+    def create_search_indexes(self):
+        try:
+            from ..repos import text_search
+
+            created = text_search.install_indexes(self.cfg)
+            QMessageBox.information(self, "Индексы поиска", f"Построены индексы: {', '.join(created)}. Поиск в форме выдачи использует их.")
+        except ValueError as e:
+            QMessageBox.warning(self, "Индексы поиска", str(e))
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать индексы поиска: {type(e).__name__}")
+
+    def bulk_import(self, table: str):
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт из CSV", filter="CSV files (*.csv *.tsv *.txt)")
+        if not path:
+            return
+        try:
+            from ..repos import bulk_import
+            from .query_runner import QueryRunner
+
+            delimiter = "\t" if path.lower().endswith(".tsv") else ","
+            runner = QueryRunner(self)
+            runner.finished.connect(self._on_import_done)
+            runner.failed.connect(lambda e: QMessageBox.critical(self, "Ошибка", f"Импорт не выполнен: {type(e).__name__}: {e}"))
+            runner.busy_changed.connect(lambda busy: self.statusBar().showMessage("Импорт…" if busy else "Импорт завершён"))
+            runner.run(bulk_import.import_csv, self.cfg, table, path, None, delimiter)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Импорт не выполнен: {type(e).__name__}")
+
+    def _on_import_done(self, result):
+        text = f"Строк в файле: {result.total}\nДобавлено: {result.inserted}\nОтклонено: {result.rejected}"
+        if result.rejects_path:
+            text += f"\n\nОтклонённые строки с причинами: {result.rejects_path}"
+        QMessageBox.information(self, "Импорт", text)
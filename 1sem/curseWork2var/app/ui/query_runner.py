@@ -0,0 +1,136 @@
+from typing import Any, Callable, Optional, Tuple
+
+import psycopg
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Qt, Signal
+from PySide6.QtWidgets import QHBoxLayout, QLabel, QPushButton, QWidget
+
+from ..db import CancelScope, QueryCancelled
+
+
+class _WorkerSignals(QObject):
+    done = Signal(object, object)  # result, exception
+
+
+class _Worker(QRunnable):
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.scope = CancelScope()
+        # not parented: must outlive the view if it is closed mid-query
+        self.signals = _WorkerSignals()
+
+    def run(self):
+        try:
+            with self.scope.active():
+                result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.done.emit(None, e)
+            return
+        self.signals.done.emit(result, None)
+
+
+class QueryRunner(QObject):
+    """Runs repo calls for one view on the global QThreadPool.
+
+    At most one query is in flight. Calls made while busy are coalesced: only
+    the latest one is kept and started when the current query finishes (whose
+    result is then dropped as stale). Results come back on the GUI thread via
+    `finished` / `failed`; `cancel()` aborts the running statement with a
+    server-side cancel request.
+    """
+
+    finished = Signal(object)
+    failed = Signal(object)
+    cancelled = Signal()
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._active: Optional[_Worker] = None
+        self._pending: Optional[tuple] = None
+
+    def is_busy(self) -> bool:
+        return self._active is not None
+
+    def run(self, fn: Callable, *args, **kwargs) -> None:
+        if self._active is not None:
+            self._pending = (fn, args, kwargs)
+            return
+        self._start(fn, args, kwargs)
+
+    def cancel(self) -> None:
+        self._pending = None
+        if self._active is not None:
+            self._active.scope.cancel()
+
+    def _start(self, fn: Callable, args: tuple, kwargs: dict) -> None:
+        worker = _Worker(fn, args, kwargs)
+        worker.signals.done.connect(self._on_done, Qt.QueuedConnection)
+        was_busy = self._active is not None
+        self._active = worker
+        QThreadPool.globalInstance().start(worker)
+        if not was_busy:
+            self.busy_changed.emit(True)
+
+    def _on_done(self, result: Any, error: Optional[Exception]) -> None:
+        worker, self._active = self._active, None
+        if self._pending is not None:
+            fn, args, kwargs = self._pending
+            self._pending = None
+            self._start(fn, args, kwargs)
+            return
+        self.busy_changed.emit(False)
+        if worker is not None and worker.scope.cancelled and (
+            error is None or isinstance(error, (QueryCancelled, psycopg.errors.QueryCanceled))
+        ):
+            self.cancelled.emit()
+        elif error is not None:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(result)
+
+
+class StreamFeed(QObject):
+    """Carries a streamed result from the worker to the GUI thread batch by batch."""
+
+    columns = Signal(object)
+    rows = Signal(object)
+
+
+def feed_stream(open_stream: Callable, feed: StreamFeed, limit: Optional[int] = None) -> Tuple[int, bool]:
+    """Worker side: emit the columns, then at most `limit` rows in batches.
+
+    Returns (rows emitted, whether the result has more rows). Reading stops
+    at `limit`: the rest of the result is neither transferred nor counted.
+    """
+    total = 0
+    with open_stream() as (cols, batches):
+        feed.columns.emit(cols)
+        for batch in batches:
+            if limit is not None and total + len(batch) > limit:
+                feed.rows.emit(batch[: limit - total])
+                return limit, True
+            feed.rows.emit(batch)
+            total += len(batch)
+            if limit is not None and total == limit:
+                # one more batch only tells whether anything follows
+                return total, next(batches, None) is not None
+    return total, False
+
+
+class LoadingIndicator(QWidget):
+    """"Загрузка…" label with a cancel button, visible while the runner is busy."""
+
+    def __init__(self, runner: QueryRunner, text: str = "Загрузка…", parent=None):
+        super().__init__(parent)
+        self.label = QLabel(text)
+        self.btn_cancel = QPushButton("Отмена")
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label)
+        layout.addWidget(self.btn_cancel)
+        self.btn_cancel.clicked.connect(runner.cancel)
+        runner.busy_changed.connect(self.setVisible)
+        self.setVisible(runner.is_busy())
@@ -1,3 +1,5 @@
+from functools import partial
+
 from PySide6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -9,10 +11,15 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
 )
+from PySide6.QtCore import QLocale
 
 from ...config import PostgresConfig
 from ...repos import reports_repo
-from .report_table_model import ReportTableModel, format_table_txt
+from .report_table_model import ReportTableModel
+from . import report_export
+from ..column_widths import ColumnAutoSizer
+from ..query_runner import QueryRunner, LoadingIndicator, StreamFeed, feed_stream
+from ..keyset_model import MAX_ROWS
 from datetime import date
 
 
@@ -25,6 +32,8 @@ class ActiveLoansReport(QWidget):
         self.resize(900, 500)
 
         self.table = QTableView()
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.table)
 
         self.lbl_from = QLabel('Дата с')
         self.le_from = QLineEdit()
@@ -35,7 +44,7 @@ class ActiveLoansReport(QWidget):
         self.btn_apply = QPushButton('Применить')
 
         self.btn_refresh = QPushButton('Обновить')
-        self.btn_export = QPushButton('Экспорт в TXT')
+        self.btn_export = QPushButton('Экспорт…')
         self.btn_close = QPushButton('Закрыть')
 
         filter_layout = QHBoxLayout()
@@ -45,9 +54,25 @@ class ActiveLoansReport(QWidget):
         filter_layout.addWidget(self.le_to)
         filter_layout.addWidget(self.btn_apply)
 
+        self._runner = QueryRunner(self)
+        self._runner.finished.connect(self._on_loaded)
+        self._runner.failed.connect(self._on_load_failed)
+
+        # exports stream from the server on their own worker, see on_export
+        self._export_runner = QueryRunner(self)
+        self._export_runner.finished.connect(self._on_exported)
+        self._export_runner.failed.connect(self._on_export_failed)
+        self._export_runner.cancelled.connect(lambda: QMessageBox.information(self, 'Экспорт', 'Экспорт отменён'))
+        self._export_runner.busy_changed.connect(lambda busy: self.btn_export.setEnabled(not busy))
+        self._export_indicator = LoadingIndicator(self._export_runner, 'Экспорт…')
+        self._export_progress = report_export.ExportProgress(self)
+        self._export_progress.changed.connect(lambda n: self._export_indicator.label.setText(f'Экспорт: {n} строк…'))
+
         btn_layout = QHBoxLayout()
         btn_layout.addWidget(self.btn_refresh)
+        btn_layout.addWidget(LoadingIndicator(self._runner))
         btn_layout.addStretch()
+        btn_layout.addWidget(self._export_indicator)
         btn_layout.addWidget(self.btn_export)
         btn_layout.addWidget(self.btn_close)
 
@@ -64,7 +89,8 @@ class ActiveLoansReport(QWidget):
         self.btn_close.clicked.connect(self.close)
 
         self._columns = []
-        self._rows = []
+        self.model = None
+        self._feed = None
         self.load_data()
 
         # add reset to button layout (placed after load to ensure btn_layout exists)
@@ -73,61 +99,104 @@ class ActiveLoansReport(QWidget):
         except Exception:
             pass
 
+    def _date_filter(self):
+        """(date_from, date_to) from the filter fields, or None after warning about bad input."""
+        df = None
+        dt = None
+        if self.le_from.text().strip():
+            try:
+                df = date.fromisoformat(self.le_from.text().strip())
+            except Exception:
+                QMessageBox.warning(self, 'Ошибка', 'Неверный формат даты (Дата с)')
+                return None
+        if self.le_to.text().strip():
+            try:
+                dt = date.fromisoformat(self.le_to.text().strip())
+            except Exception:
+                QMessageBox.warning(self, 'Ошибка', 'Неверный формат даты (Дата по)')
+                return None
+        # validate date range
+        if df and dt and df > dt:
+            QMessageBox.warning(self, 'Ошибка', 'Дата с должна быть <= Дата по')
+            return None
+        return df, dt
+
     def load_data(self):
         try:
-            # parse dates
-            df = None
-            dt = None
-            if self.le_from.text().strip():
-                try:
-                    df = date.fromisoformat(self.le_from.text().strip())
-                except Exception:
-                    QMessageBox.warning(self, 'Ошибка', 'Неверный формат даты (Дата с)')
-                    return
-            if self.le_to.text().strip():
-                try:
-                    dt = date.fromisoformat(self.le_to.text().strip())
-                except Exception:
-                    QMessageBox.warning(self, 'Ошибка', 'Неверный формат даты (Дата по)')
-                    return
-            # validate date range
-            if df and dt and df > dt:
-                QMessageBox.warning(self, 'Ошибка', 'Дата с должна быть <= Дата по')
+            dates = self._date_filter()
+            if dates is None:
                 return
+            df, dt = dates
+
+            # rows stream in from a worker thread batch by batch, see _on_columns/_on_rows;
+            # a fresh feed per load so batches of a superseded query are ignored
+            feed = StreamFeed()
+            feed.columns.connect(partial(self._on_columns, feed))
+            feed.rows.connect(partial(self._on_rows, feed))
+            self._feed = feed
+            self._runner.run(feed_stream, partial(reports_repo.stream_active_loans, self.cfg, df, dt), feed, MAX_ROWS)
+        except Exception as e:
+            QMessageBox.critical(self, 'Ошибка', f'Не удалось загрузить отчёт: {type(e).__name__}')
+
+    def _on_load_failed(self, e):
+        QMessageBox.critical(self, 'Ошибка', f'Не удалось загрузить отчёт: {type(e).__name__}')
 
-            self._columns, self._rows = reports_repo.report_active_loans(self.cfg, df, dt)
-            self.model = ReportTableModel(self._columns, self._rows)
-            self.table.setModel(self.model)
-            self.table.resizeColumnsToContents()
+    def _on_columns(self, feed, columns):
+        if feed is not self._feed:
+            return
+        self._columns = list(columns)
+        # amounts and dates in the user's locale; exports keep the raw values
+        self.model = ReportTableModel(self._columns, [], locale=QLocale())
+        self.table.setModel(self.model)
+
+    def _on_rows(self, feed, rows):
+        if feed is not self._feed or self.model is None:
+            return
+        first = self.model.rowCount() == 0
+        self.model.append_rows(rows)
+        if first:
+            self._sizer.apply()
+
+    def _on_loaded(self, result):
+        try:
             # update title with row count
-            try:
-                self.setWindowTitle(f"Отчёт: Активные выдачи — строк: {len(self._rows)}")
-            except Exception:
-                pass
+            total, more = result
+            if more:
+                # the view keeps at most MAX_ROWS rows and the rest is not read; export gives the full report
+                title = f"Отчёт: Активные выдачи — строк: больше {total} (показаны первые {total})"
+            else:
+                title = f"Отчёт: Активные выдачи — строк: {total}"
+            self.setWindowTitle(title)
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Не удалось загрузить отчёт: {type(e).__name__}')
 
     def on_export(self):
-        path, _ = QFileDialog.getSaveFileName(self, 'Сохранить отчёт', filter='Text files (*.txt)')
+        path, selected = QFileDialog.getSaveFileName(self, 'Сохранить отчёт', filter=report_export.FILE_FILTER)
         if not path:
             return
-        try:
-            if not path.lower().endswith('.txt'):
-                path = path + '.txt'
-            header_lines = []
-            from datetime import date as _d
-            header_lines.append(f"Generated: {_d.today().isoformat()}")
-            if self.le_from.text().strip():
-                header_lines.append(f"Date from: {self.le_from.text().strip()}")
-            if self.le_to.text().strip():
-                header_lines.append(f"Date to: {self.le_to.text().strip()}")
-            header_lines.append('')
-            body = format_table_txt(self._columns, self._rows, max_col_width=40)
-            with open(path, 'w', encoding='utf-8') as fh:
-                fh.write('\n'.join(header_lines) + '\n' + body)
-            QMessageBox.information(self, 'OK', 'Экспорт завершён')
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Не удалось сохранить файл: {type(e).__name__}')
+        dates = self._date_filter()
+        if dates is None:
+            return
+        path, fmt = report_export.resolve_path(path, selected)
+        header_lines = []
+        header_lines.append(f"Generated: {date.today().isoformat()}")
+        if self.le_from.text().strip():
+            header_lines.append(f"Date from: {self.le_from.text().strip()}")
+        if self.le_to.text().strip():
+            header_lines.append(f"Date to: {self.le_to.text().strip()}")
+        header_lines.append('')
+        # rows are re-read from the server and streamed to disk, not taken from the view
+        open_stream = partial(reports_repo.stream_active_loans, self.cfg, *dates)
+        self._export_runner.run(report_export.export_report, open_stream, path, fmt, header_lines, self._export_progress.changed.emit)
+
+    def _on_exported(self, result):
+        path, rows = result
+        self._export_indicator.label.setText('Экспорт…')
+        QMessageBox.information(self, 'OK', f'Сохранено: {path} (строк: {rows})')
+
+    def _on_export_failed(self, e):
+        self._export_indicator.label.setText('Экспорт…')
+        QMessageBox.critical(self, 'Ошибка', f'Не удалось сохранить файл: {type(e).__name__}: {e}')
 
     def on_reset(self):
         self.le_from.clear()
@@ -0,0 +1,134 @@
+"""Streaming export of reports to CSV, TSV, JSON Lines or fixed-width TXT.
+
+Rows come in batches from a server-side cursor (see `repos.streaming`) and are
+written straight to disk, so memory does not depend on the report size. The
+file is written next to the target as `<path>.part` and renamed on success.
+"""
+import csv
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+from .report_table_model import _truncate
+
+FORMATS = {
+    'csv': 'CSV (*.csv)',
+    'tsv': 'TSV (*.tsv)',
+    'jsonl': 'JSON Lines (*.jsonl)',
+    'txt': 'Text files (*.txt)',
+}
+FILE_FILTER = ';;'.join(FORMATS.values())
+
+
+class ExportProgress(QObject):
+    """Rows written so far; emitted from the worker thread, delivered on the GUI thread."""
+    changed = Signal(int)
+
+
+def resolve_path(path: str, selected_filter: str = '') -> Tuple[str, str]:
+    """Pick the format from the extension or the dialog filter and add a missing extension."""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in FORMATS:
+        return path, ext
+    fmt = next((f for f, flt in FORMATS.items() if flt == selected_filter), 'txt')
+    return f"{path}.{fmt}", fmt
+
+
+def _cell(v) -> str:
+    return "" if v is None else str(v)
+
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return int(v) if v == v.to_integral_value() else float(v)
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return str(v)
+
+
+def export_rows(
+    path: str,
+    fmt: str,
+    columns: List[str],
+    batches: Iterable[Sequence[tuple]],
+    header_lines: Sequence[str] = (),
+    max_col_width: int = 40,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Write all batches to `path` in `fmt`; returns the number of rows written.
+
+    `header_lines` are only used by the TXT format (as in the old TXT export).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    part = path + '.part'
+    written = 0
+    try:
+        with open(part, 'w', encoding='utf-8', newline='') as fh:
+            if fmt in ('csv', 'tsv'):
+                writer = csv.writer(fh, delimiter='\t' if fmt == 'tsv' else ',')
+                writer.writerow(columns)
+                for batch in batches:
+                    writer.writerows([_cell(v) for v in r] for r in batch)
+                    written += len(batch)
+                    if progress:
+                        progress(written)
+            elif fmt == 'jsonl':
+                for batch in batches:
+                    for r in batch:
+                        fh.write(json.dumps(dict(zip(columns, r)), ensure_ascii=False, default=_json_default))
+                        fh.write('\n')
+                    written += len(batch)
+                    if progress:
+                        progress(written)
+            else:
+                written = _write_txt(fh, columns, batches, header_lines, max_col_width, progress)
+        os.replace(part, path)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+def _write_txt(fh, columns, batches, header_lines, max_col_width, progress) -> int:
+    # column widths depend on every row, so the truncated cells are spooled to a
+    # temp file on the first pass and laid out on the second one
+    widths = [min(len(str(h)), max_col_width) for h in columns]
+    written = 0
+    with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as spool:
+        spooler = csv.writer(spool)
+        for batch in batches:
+            for r in batch:
+                cells = [_truncate(_cell(v), max_col_width) for v in r]
+                for i, c in enumerate(cells):
+                    if len(c) > widths[i]:
+                        widths[i] = len(c)
+                spooler.writerow(cells)
+            written += len(batch)
+            if progress:
+                progress(written)
+
+        if header_lines:
+            fh.write('\n'.join(header_lines) + '\n')
+        header = ' | '.join(columns[i].ljust(widths[i]) for i in range(len(columns)))
+        fh.write(header + '\n')
+        fh.write('-' * len(header))
+        spool.seek(0)
+        for cells in csv.reader(spool):
+            fh.write('\n' + ' | '.join(cells[i].ljust(widths[i]) for i in range(len(columns))))
+    return written
+
+
+def export_report(open_stream: Callable, path: str, fmt: str, header_lines: Sequence[str] = (), progress: Optional[Callable[[int], None]] = None) -> Tuple[str, int]:
+    """Open the report stream (`stream_*` from reports_repo) and export it; returns (path, rows)."""
+    with open_stream() as (columns, batches):
+        rows = export_rows(path, fmt, columns, batches, header_lines, progress=progress)
+    return path, rows
@@ -1,16 +1,30 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtCore import Qt, QAbstractTableModel, QLocale, QModelIndex
+
+from ..column_store import CellFormatter, ColumnStore
 
 
 class ReportTableModel(QAbstractTableModel):
-    def __init__(self, columns: List[str], rows: List[tuple]):
+    def __init__(self, columns: List[str], rows: List[tuple], locale: Optional[QLocale] = None):
         super().__init__()
         self._columns = columns
-        self._rows = rows
+        # display strings are formatted on first paint and cached, see ColumnStore
+        self._store = ColumnStore(len(columns), rows, CellFormatter(locale))
+
+    def append_rows(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        start = len(self._store)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._store.extend(rows)
+        self.endInsertRows()
+
+    def rows(self) -> List[tuple]:
+        return self._store.rows()
 
     def rowCount(self, parent=QModelIndex()):
-        return len(self._rows)
+        return len(self._store)
 
     def columnCount(self, parent=QModelIndex()):
         return len(self._columns)
@@ -19,8 +33,7 @@ class ReportTableModel(QAbstractTableModel):
         if not index.isValid():
             return None
         if role in (Qt.DisplayRole, Qt.EditRole):
-            val = self._rows[index.row()][index.column()]
-            return "" if val is None else str(val)
+            return self._store.text(index.row(), index.column())
         return None
 
     def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
@@ -0,0 +1,104 @@
+"""Line edit with a server-side type-ahead completer (see repos.text_search).
+
+Typing pauses for `SEARCH_DELAY` ms before the search runs on a QueryRunner,
+so a fast typist causes one query, and a query still running when the text
+changes again is superseded by the newer one. Only the returned hits (at most
+`text_search.SEARCH_LIMIT`) are ever held by the widget.
+"""
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QModelIndex, Qt, QTimer, Signal
+from PySide6.QtGui import QStandardItem, QStandardItemModel
+from PySide6.QtWidgets import QCompleter, QLineEdit
+
+from .query_runner import QueryRunner
+
+SEARCH_DELAY = 250
+# shorter texts are not searched, except numbers (ids)
+MIN_CHARS = 2
+
+_HIT_ROLE = Qt.UserRole + 1
+
+
+class SearchBox(QLineEdit):
+    """Picks one row by typing part of its label.
+
+    `search(text)` runs on a worker thread and returns hits as dicts with at
+    least 'id' and 'label'. `currentData()` is the id of the chosen hit (None
+    while the text does not correspond to one), like QComboBox.
+    """
+
+    selection_changed = Signal()
+
+    def __init__(self, search: Callable[[str], List[Dict]], parent=None):
+        super().__init__(parent)
+        self._search = search
+        self._current: Optional[Dict] = None
+        self._model = QStandardItemModel(self)
+        self._completer = QCompleter(self._model, self)
+        # the server already filtered: show every hit as is
+        self._completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self._completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self._completer.setMaxVisibleItems(12)
+        self._completer.setWidget(self)
+        self._completer.activated[QModelIndex].connect(self._on_activated)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SEARCH_DELAY)
+        self._timer.timeout.connect(self._run_search)
+        self._runner = QueryRunner(self)
+        self._runner.finished.connect(self._on_hits)
+        self._runner.failed.connect(self._on_failed)
+
+        self.setPlaceholderText("начните вводить для поиска")
+        self.textEdited.connect(self._on_edited)
+
+    def currentData(self):
+        return self._current['id'] if self._current else None
+
+    def current_hit(self) -> Optional[Dict]:
+        return self._current
+
+    def set_current(self, hit: Optional[Dict]) -> None:
+        """Select a hit (e.g. from the repo's `lookup`) without searching."""
+        self._timer.stop()
+        self._current = hit
+        self.setText(hit['label'] if hit else "")
+        self.selection_changed.emit()
+
+    def _on_edited(self, text: str):
+        if self._current is not None:
+            self._current = None
+            self.selection_changed.emit()
+        self._timer.start()
+
+    def _run_search(self):
+        text = self.text().strip()
+        if len(text) < MIN_CHARS and not text.isdigit():
+            self._model.clear()
+            self._completer.popup().hide()
+            return
+        self._runner.run(self._search, text)
+
+    def _on_hits(self, hits: List[Dict]):
+        if self._current is not None or not self.hasFocus():
+            # chosen meanwhile or the user moved on
+            return
+        self._model.clear()
+        for hit in hits:
+            item = QStandardItem(hit['label'])
+            item.setData(hit, _HIT_ROLE)
+            self._model.appendRow(item)
+        if hits:
+            self._completer.complete()
+        else:
+            self._completer.popup().hide()
+
+    def _on_failed(self, e):
+        self.setToolTip(f"Поиск не удался: {type(e).__name__}")
+
+    def _on_activated(self, index: QModelIndex):
+        hit = index.data(_HIT_ROLE)
+        if hit is not None:
+            self.set_current(hit)
@@ -10,6 +10,12 @@ class Config:
     dbname: str
     user: str
     password: str
+    # connection pool, see app.core.db.ConnectionPool
+    pool_min_size: int = 1
+    pool_max_size: int = 5
+    pool_max_lifetime: float = 1800.0
+    pool_idle_timeout: float = 300.0
+    pool_timeout: float = 10.0
 
 
 def _require(s: configparser.SectionProxy, key: str) -> str:
@@ -24,7 +30,9 @@ def load_config(path: str | None = None) -> Config:
     Load config from `path` or from APP_CONFIG env or ./config.ini.
 
     Expects an INI file with a [postgresql] section containing:
-    host, port, dbname, user, password.
+    host, port, dbname, user, password. Optional pool settings:
+    pool_min_size, pool_max_size, pool_max_lifetime, pool_idle_timeout and
+    pool_timeout (seconds to wait for a free connection).
     """
     path = path or os.environ.get("APP_CONFIG", "./config.ini")
     parser = configparser.ConfigParser()
@@ -46,4 +54,17 @@ def load_config(path: str | None = None) -> Config:
     except ValueError as e:
         raise ValueError(f"Invalid port value: {port_str!r}") from e
 
-    return Config(host=host, port=port, dbname=dbname, user=user, password=password)
+    try:
+        pool = dict(
+            pool_min_size=s.getint("pool_min_size", fallback=1),
+            pool_max_size=s.getint("pool_max_size", fallback=5),
+            pool_max_lifetime=s.getfloat("pool_max_lifetime", fallback=1800.0),
+            pool_idle_timeout=s.getfloat("pool_idle_timeout", fallback=300.0),
+            pool_timeout=s.getfloat("pool_timeout", fallback=10.0),
+        )
+    except ValueError as e:
+        raise ValueError(f"Invalid pool setting in [postgresql]: {e}") from e
+    if pool["pool_max_size"] < 1 or not 0 <= pool["pool_min_size"] <= pool["pool_max_size"]:
+        raise ValueError(f"Invalid pool size: min={pool['pool_min_size']}, max={pool['pool_max_size']}")
+
+    return Config(host=host, port=port, dbname=dbname, user=user, password=password, **pool)
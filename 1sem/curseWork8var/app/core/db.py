@@ -1,12 +1,22 @@
-from .config import Config
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg
+from psycopg.pq import TransactionStatus
 
+from .config import Config
 
-def get_conn(cfg: Config):
-    """Return a new psycopg connection using values from Config.
+logger = logging.getLogger(__name__)
 
-    Caller is responsible for closing the connection.
-    """
+# a connection idle for longer than this is pinged before it is handed out
+CHECK_INTERVAL = 30.0
+
+
+def connect(cfg: Config):
+    """Open a new, unpooled psycopg connection. Prefer `get_conn`."""
     return psycopg.connect(
         host=cfg.host,
         port=cfg.port,
@@ -14,3 +24,181 @@ def get_conn(cfg: Config):
         user=cfg.user,
         password=cfg.password,
     )
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg connections for one Config.
+
+    At most `max_size` connections are open; a checkout waits up to `timeout`
+    seconds for a free one. Idle connections are reused LIFO and pinged with
+    `SELECT 1` if they sat idle longer than `CHECK_INTERVAL`. Connections older
+    than `max_lifetime` seconds are closed instead of reused, and idle ones
+    above `min_size` are closed after `idle_timeout` seconds.
+    """
+
+    def __init__(self, cfg: Config, min_size: int = 1, max_size: int = 5, max_lifetime: float = 1800.0,
+                 idle_timeout: float = 300.0, timeout: float = 10.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        self.cfg = cfg
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: deque = deque()  # (conn, created, last_used), monotonic seconds
+        self._created: dict = {}  # id(conn) -> created, for checked-out connections
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float | None = None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._prune_idle_locked()
+                if self._idle:
+                    conn, created, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn = created = last_used = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No free database connection (pool max_size={self.max_size})")
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = connect(self.cfg)
+                except Exception:
+                    self._discard()
+                    raise
+                created = time.monotonic()
+            elif not self._is_healthy(conn, created, last_used):
+                self._close_quietly(conn)
+                self._discard()
+                continue
+            with self._cond:
+                self._created[id(conn)] = created
+            return conn
+
+    def putconn(self, conn) -> None:
+        with self._cond:
+            created = self._created.pop(id(conn), 0.0)
+        if not conn.closed and not conn.broken:
+            try:
+                if conn.info.transaction_status != TransactionStatus.IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                self._close_quietly(conn)
+        expired = time.monotonic() - created > self.max_lifetime
+        if conn.closed or conn.broken or expired:
+            self._close_quietly(conn)
+            self._discard()
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, created, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def _is_healthy(self, conn, created: float, last_used: float) -> bool:
+        if conn.closed or conn.broken:
+            return False
+        now = time.monotonic()
+        if now - created > self.max_lifetime:
+            return False
+        if now - last_used < CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.info("Dropping stale pooled connection: %s", type(e).__name__)
+            return False
+
+    def _prune_idle_locked(self) -> None:
+        # oldest connections sit at the left end of the deque
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][2] > self.idle_timeout:
+            conn, _, _ = self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(conn)
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools: dict[Config, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(cfg: Config) -> ConnectionPool:
+    """Return the process-wide pool for `cfg`, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(cfg)
+        if pool is None:
+            pool = ConnectionPool(
+                cfg,
+                min_size=cfg.pool_min_size,
+                max_size=cfg.pool_max_size,
+                max_lifetime=cfg.pool_max_lifetime,
+                idle_timeout=cfg.pool_idle_timeout,
+                timeout=cfg.pool_timeout,
+            )
+            _pools[cfg] = pool
+        return pool
+
+
+@contextmanager
+def get_conn(cfg: Config):
+    """Borrow a pooled psycopg connection for a `with` block.
+
+    Same semantics as `with psycopg.connect(...) as conn`: the transaction is
+    committed when the block ends normally and rolled back on an exception;
+    then the connection goes back to the pool instead of being closed.
+    """
+    pool = get_pool(cfg)
+    conn = pool.getconn()
+    try:
+        yield conn
+        if not conn.closed and not conn.broken and conn.info.transaction_status != TransactionStatus.IDLE:
+            conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
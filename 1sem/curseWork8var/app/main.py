@@ -1,7 +1,7 @@
 import sys
 from PySide6.QtWidgets import QApplication, QMessageBox, QDialog
 from app.core.config import load_config
-from app.core.db import get_conn
+from app.core.db import close_all_pools, get_conn
 from app.ui.main_window import MainWindow
 from app.ui.login_window import LoginWindow
 
@@ -22,6 +22,7 @@ def main():
     # We intentionally do not force any platform here — Qt will honor
     # `QT_QPA_PLATFORM` if provided by the caller.
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(close_all_pools)
 
     try:
         cfg = load_config()
@@ -90,6 +90,8 @@ JOIN warehouses w ON w.id = s.warehouse_id
 ORDER BY s.id;
 """,
             headers=["ID", "Товар", "Кол-во", "Цена за ед.", "Дата продажи"],
+            # journals grow without bound: load them page by page
+            paged=True,
         )
 
         self._add_grid_page(
@@ -106,12 +108,13 @@ JOIN expense_items e ON e.id = c.expense_item_id
 ORDER BY c.id;
 """,
             headers=["ID", "Статья", "Сумма", "Дата"],
+            paged=True,
         )
         # Reports pages
-        rpt1 = ProfitReportPage(self.cfg, "Отчёты / Прибыль за месяц")
+        rpt1 = ProfitReportPage(self.cfg, "Отчёты / Прибыль по месяцам")
         self.pages[PAGE_REPORT_PROFIT] = rpt1
         self.stacked.addWidget(rpt1)
-        self.page_titles[PAGE_REPORT_PROFIT] = "Отчёты / Прибыль за месяц"
+        self.page_titles[PAGE_REPORT_PROFIT] = "Отчёты / Прибыль по месяцам"
 
         rpt2 = Top5ReportPage(self.cfg, "Отчёты / ТОП-5 доходных товаров")
         self.pages[PAGE_REPORT_TOP5] = rpt2
@@ -143,7 +146,7 @@ ORDER BY c.id;
         menubar.addMenu(menu_journals)
 
         menu_reports = QMenu("ОТЧЁТЫ", self)
-        act_profit = QAction("Прибыль за месяц", self)
+        act_profit = QAction("Прибыль по месяцам", self)
         act_profit.triggered.connect(lambda: self.show_page(PAGE_REPORT_PROFIT))
         act_top5 = QAction("ТОП-5 доходных товаров", self)
         act_top5.triggered.connect(lambda: self.show_page(PAGE_REPORT_TOP5))
@@ -193,9 +196,9 @@ ORDER BY c.id;
         # Show initial page (this will auto-load grid page)
         self.show_page(PAGE_GOODS)
 
-    def _add_grid_page(self, key: str, title: str, sql: str, headers: list[str]) -> None:
+    def _add_grid_page(self, key: str, title: str, sql: str, headers: list[str], paged: bool = False) -> None:
         page = GridPage(self.cfg, title)
-        page.set_query(sql, headers)
+        page.set_query(sql, headers, paged=paged)
         self.pages[key] = page
         self.stacked.addWidget(page)
         self.page_titles[key] = title
@@ -0,0 +1,152 @@
+"""Column-wise storage of table rows with lazily cached display strings.
+
+Qt asks a model for the display text of a cell many times (painting, size
+hints, `resizeColumnsToContents`), so the models here format each value once,
+on first access, and keep the string; only cells that were actually shown
+have one. Columns holding only integers are packed into `array('q')`; other
+columns are plain lists in which equal strings and dates share one object
+(a warehouse name repeats on every sale).
+"""
+import sys
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+
+from PySide6.QtCore import QDate, QDateTime, QLocale
+
+_INT_MIN, _INT_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class CellFormatter:
+    """Turns a cell value into display text.
+
+    Without a locale values are shown as `str(value)`. With one, Decimal,
+    float, date and datetime values use its number and short date formats;
+    integers (ids, counts) are left as they are. The C locale has no real
+    date format, so dates stay ISO there.
+    """
+
+    def __init__(self, locale: QLocale | None = None):
+        self.locale = locale
+        self._local_dates = locale is not None and locale.language() != QLocale.C
+
+    def __call__(self, value: Any) -> str:
+        if value is None:
+            return ""
+        loc = self.locale
+        if loc is not None:
+            if isinstance(value, Decimal):
+                exp = value.as_tuple().exponent
+                return loc.toString(float(value), 'f', max(0, -exp) if isinstance(exp, int) else 2)
+            if isinstance(value, float):
+                return loc.toString(value, 'f', 2)
+            if not self._local_dates:
+                return str(value)
+            if isinstance(value, datetime):
+                return loc.toString(QDateTime(value), QLocale.ShortFormat)
+            if isinstance(value, date):
+                return loc.toString(QDate(value.year, value.month, value.day), QLocale.ShortFormat)
+        return str(value)
+
+
+def _packable(values: Sequence) -> bool:
+    return all(type(v) is int and _INT_MIN <= v <= _INT_MAX for v in values)
+
+
+def _shift_keys(cache: dict, pos: int, n: int) -> dict:
+    return {(k + n if k >= pos else k): s for k, s in cache.items()}
+
+
+class ColumnStore:
+    """Rows of a fixed number of columns, stored column by column."""
+
+    def __init__(self, width: int, rows: Iterable[Sequence] = (), formatter: CellFormatter | None = None):
+        self._cols: list[Any] = [array('q') for _ in range(width)]
+        # display string per cell by row, added on first access
+        self._text: list[dict[int, str]] = [{} for _ in range(width)]
+        # one object per distinct date value (dates have few distinct values)
+        self._dates: dict[date, date] = {}
+        self._len = 0
+        self.formatter = formatter or CellFormatter()
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def width(self) -> int:
+        return len(self._cols)
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        self.insert(self._len, rows)
+
+    def insert(self, pos: int, rows: Iterable[Sequence]) -> None:
+        if not isinstance(rows, (list, tuple)):
+            rows = list(rows)
+        if not rows:
+            return
+        if pos < self._len:
+            self._text = [_shift_keys(cache, pos, len(rows)) for cache in self._text]
+        for c in range(len(self._cols)):
+            values = [r[c] for r in rows]
+            col = self._cols[c]
+            if isinstance(col, array):
+                if _packable(values):
+                    col[pos:pos] = array('q', values)
+                    continue
+                col = self._cols[c] = list(col)
+            col[pos:pos] = self._shared(values)
+        self._len += len(rows)
+
+    def _shared(self, values: list) -> list:
+        # a column holds one type (or None), so look at its first value only
+        kind = next((type(v) for v in values if v is not None), None)
+        if kind is str:
+            intern = sys.intern
+            return [intern(v) if type(v) is str else v for v in values]
+        if kind is date:
+            get = self._dates.setdefault
+            return [get(v, v) if type(v) is date else v for v in values]
+        return values
+
+    def delete(self, start: int, stop: int) -> None:
+        if stop <= start:
+            return
+        for c in range(len(self._cols)):
+            del self._cols[c][start:stop]
+        n = stop - start
+        self._text = [{(k - n if k >= stop else k): s for k, s in cache.items() if not start <= k < stop}
+                      for cache in self._text]
+        self._len -= n
+
+    def set_row(self, i: int, row: Sequence) -> None:
+        for c, v in enumerate(row):
+            col = self._cols[c]
+            if isinstance(col, array) and not _packable((v,)):
+                col = self._cols[c] = list(col)
+            col[i] = self._shared([v])[0] if isinstance(col, list) else v
+            self._text[c].pop(i, None)
+
+    def value(self, r: int, c: int) -> Any:
+        return self._cols[c][r]
+
+    def row(self, r: int) -> tuple:
+        """The values of row `r`; a new tuple, the store itself cannot be changed through it."""
+        return tuple(col[r] for col in self._cols)
+
+    def rows(self, start: int = 0, stop: int | None = None) -> list[tuple]:
+        if not self._cols:
+            return [()] * (self._len if stop is None else stop - start)
+        return list(zip(*(col[start:stop] for col in self._cols)))
+
+    def column(self, c: int) -> Sequence:
+        """The stored column (read-only use; replaced when its storage type changes)."""
+        return self._cols[c]
+
+    def text(self, r: int, c: int) -> str:
+        cache = self._text[c]
+        s = cache.get(r)
+        if s is None:
+            s = cache[r] = self.formatter(self._cols[c][r])
+        return s
@@ -1,11 +1,32 @@
+from functools import partial
 from typing import List, Sequence, Any
+from psycopg.sql import SQL, Identifier
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QTableView, QMessageBox
 from PySide6.QtCore import Qt
 from app.ui.widgets.table_model import TableModel
+from app.ui.widgets.column_widths import ColumnAutoSizer
+from app.ui.widgets.page_refresh import PageRefresher, busy_label
 from app.core.db import get_conn
 from app.core.config import Config
 from PySide6.QtWidgets import QAbstractItemView
 
+# rows per page in paged mode
+PAGE_SIZE = 500
+
+
+def _inner_sql(sql: str) -> SQL:
+    return SQL(sql.strip().rstrip(';'))
+
+
+def first_page_sql(sql: str) -> SQL:
+    """The first `%s` rows of `sql` ordered by its first column."""
+    return SQL("SELECT * FROM ({}) q ORDER BY 1 LIMIT %s").format(_inner_sql(sql))
+
+
+def next_page_sql(sql: str, key_column: str) -> SQL:
+    """The next `%s` rows after the key value `%s` of the first column (keyset pagination)."""
+    return SQL("SELECT * FROM ({}) q WHERE q.{} > %s ORDER BY 1 LIMIT %s").format(_inner_sql(sql), Identifier(key_column))
+
 
 class GridPage(QWidget):
     """Generic grid page showing results of a SQL query in a QTableView.
@@ -13,7 +34,12 @@ class GridPage(QWidget):
     Usage:
       page = GridPage(cfg, title)
       page.set_query(sql, headers)
-      page.refresh()
+      page.refresh()  # loads on a worker thread, see PageRefresher
+
+    In paged mode (`set_query(..., paged=True)`) the query is wrapped in keyset
+    pagination on its first column, which must be a unique, ascending id (the
+    pages are ordered by it), and further pages are fetched on a worker thread
+    while scrolling.
     """
 
     def __init__(self, cfg: Config, title: str):
@@ -22,6 +48,7 @@ class GridPage(QWidget):
         self.title = title
         self._sql: str | None = None
         self._headers: List[str] = []
+        self._paged = False
         self._loaded = False
 
         layout = QVBoxLayout(self)
@@ -30,23 +57,35 @@ class GridPage(QWidget):
         self.title_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.title_label)
 
+        # queries run on a worker thread, see refresh()
+        self.refresher = PageRefresher(self)
+        self.refresher.finished.connect(self._on_loaded)
+        self.refresher.failed.connect(self._on_load_failed)
+        layout.addWidget(busy_label(self.refresher))
+
         self.view = QTableView()
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.view)
         self.model = TableModel([], [])
+        self.model.fetch_failed.connect(self._on_fetch_failed)
         self.view.setModel(self.model)
         self.view.setAlternatingRowColors(True)
         self.view.horizontalHeader().setStretchLastSection(True)
         self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
         layout.addWidget(self.view)
+        # further pages of paged mode load in the background while scrolling
+        layout.addWidget(busy_label(self.model.pages, "Загрузка строк…"))
 
     @property
     def loaded(self) -> bool:
         return self._loaded
 
-    def set_query(self, sql: str, headers: Sequence[str]) -> None:
+    def set_query(self, sql: str, headers: Sequence[str], paged: bool = False) -> None:
         """Set the SQL query and column headers for this page."""
         self._sql = sql
         self._headers = list(headers)
+        self._paged = paged
 
     def selected_row_index(self) -> int | None:
         sm = self.view.selectionModel()
@@ -57,7 +96,7 @@ class GridPage(QWidget):
             return None
         return rows[0].row()
 
-    def selected_row(self) -> list[Any] | None:
+    def selected_row(self) -> tuple | None:
         idx = self.selected_row_index()
         if idx is None:
             return None
@@ -83,22 +122,45 @@ class GridPage(QWidget):
             return None
 
     def refresh(self) -> None:
+        """Reload the page in the background; the model is replaced when the rows arrive."""
         if not self._sql:
             return
-        try:
-            rows = []
-            with get_conn(self.cfg) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(self._sql)
-                    rows = cur.fetchall()
-            # update model
+        self.refresher.request(self._query, self._sql, self._paged)
+
+    def _query(self, sql: str, paged: bool) -> tuple:
+        # worker thread: database only, no widgets
+        with get_conn(self.cfg) as conn:
+            with conn.cursor() as cur:
+                if paged:
+                    cur.execute(first_page_sql(sql), (PAGE_SIZE,))
+                else:
+                    cur.execute(sql)
+                rows = cur.fetchall()
+                key_column = cur.description[0].name if paged and cur.description else None
+        return sql, rows, key_column
+
+    def _on_loaded(self, result: tuple) -> None:
+        sql, rows, key_column = result
+        if key_column:
+            self.model.set_data(self._headers, rows, fetch_page=partial(self._fetch_page, sql, key_column), page_size=PAGE_SIZE)
+        else:
             self.model.set_data(self._headers, rows)
-            try:
-                self.view.resizeColumnsToContents()
-            except Exception:
-                pass
-            self._loaded = True
-        except Exception as e:
-            # ensure loaded flag reflects state
-            self._loaded = False
-            QMessageBox.critical(self, "DB error", str(e))
+        try:
+            self._sizer.apply()
+        except Exception:
+            pass
+        self._loaded = True
+
+    def _on_load_failed(self, e: Exception) -> None:
+        # ensure loaded flag reflects state
+        self._loaded = False
+        QMessageBox.critical(self, "DB error", str(e))
+
+    def _fetch_page(self, sql: str, key_column: str, after: Any) -> list[tuple]:
+        with get_conn(self.cfg) as conn:
+            with conn.cursor() as cur:
+                cur.execute(next_page_sql(sql, key_column), (after, PAGE_SIZE))
+                return cur.fetchall()
+
+    def _on_fetch_failed(self, e: Exception) -> None:
+        QMessageBox.critical(self, "DB error", str(e))
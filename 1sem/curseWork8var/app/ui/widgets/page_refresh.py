@@ -0,0 +1,102 @@
+"""Runs page queries off the GUI thread.
+
+A page hands its database work to a `PageRefresher` as a plain function and
+gets the result back on the GUI thread. At most one query per page is in
+flight: a request made while one runs replaces any earlier waiting request
+and starts when the running one ends, whose result is then dropped as stale
+(the user already asked for something newer, e.g. another month). Requesting
+exactly what is already running or waiting is a no-op, so repeated toolbar
+clicks cost one query.
+"""
+from typing import Any, Callable
+
+from PySide6.QtCore import QEventLoop, QObject, QRunnable, QThreadPool, Qt, QTimer, Signal
+from PySide6.QtWidgets import QLabel
+
+
+class _WorkerSignals(QObject):
+    done = Signal(object, object)  # result, exception
+
+
+class _Worker(QRunnable):
+    def __init__(self, fn: Callable, args: tuple):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        # not parented: must outlive the page if it is closed mid-query
+        self.signals = _WorkerSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.done.emit(None, e)
+            return
+        self.signals.done.emit(result, None)
+
+
+class PageRefresher(QObject):
+    """Latest-wins query scheduler for one page (see module docstring)."""
+
+    finished = Signal(object)
+    failed = Signal(object)
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._running: tuple | None = None
+        self._pending: tuple | None = None
+
+    def is_busy(self) -> bool:
+        return self._running is not None
+
+    def wait(self, timeout_ms: int = 30000) -> bool:
+        """Process events until no query runs (scripts and the smoke test); False on timeout."""
+        if not self.is_busy():
+            return True
+        loop = QEventLoop()
+        self.busy_changed.connect(loop.quit)
+        QTimer.singleShot(timeout_ms, loop.quit)
+        loop.exec()
+        self.busy_changed.disconnect(loop.quit)
+        return not self.is_busy()
+
+    def request(self, fn: Callable, *args: Any) -> None:
+        """Run `fn(*args)` on a worker thread; `finished` gets its result."""
+        call = (fn, args)
+        if self._running is None:
+            self._start(call)
+        elif call == self._running and self._pending is None:
+            # the same query is already on its way
+            return
+        else:
+            self._pending = call
+
+    def _start(self, call: tuple) -> None:
+        worker = _Worker(*call)
+        worker.signals.done.connect(self._on_done, Qt.QueuedConnection)
+        was_busy = self._running is not None
+        self._running = call
+        QThreadPool.globalInstance().start(worker)
+        if not was_busy:
+            self.busy_changed.emit(True)
+
+    def _on_done(self, result: Any, error: Exception | None) -> None:
+        if self._pending is not None:
+            call, self._pending = self._pending, None
+            self._start(call)
+            return
+        self._running = None
+        self.busy_changed.emit(False)
+        if error is not None:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(result)
+
+
+def busy_label(refresher: PageRefresher, text: str = "Загрузка…") -> QLabel:
+    """Label that is visible while the refresher has a query running."""
+    label = QLabel(text)
+    label.setVisible(refresher.is_busy())
+    refresher.busy_changed.connect(label.setVisible)
+    return label
@@ -11,8 +11,10 @@ from PySide6.QtWidgets import (
     QMessageBox,
     QFileDialog,
 )
-from PySide6.QtCore import Qt, QDate
+from PySide6.QtCore import Qt, QDate, QLocale
 from app.ui.widgets.table_model import TableModel
+from app.ui.widgets.column_widths import ColumnAutoSizer
+from app.ui.widgets.page_refresh import PageRefresher, busy_label
 from app.core.db import get_conn
 from app.core.config import Config
 from PySide6.QtWidgets import QAbstractItemView
@@ -39,15 +41,35 @@ class ProfitReportPage(QWidget):
         d = QDate.currentDate()
         self.date_edit.setDate(QDate(d.year(), d.month(), 1))
         ctrl.addWidget(self.date_edit)
+        # last month of the series; equal to the first one for a single month
+        ctrl.addWidget(QLabel("по:"))
+        self.date_edit_to = QDateEdit()
+        self.date_edit_to.setDisplayFormat("yyyy-MM")
+        self.date_edit_to.setCalendarPopup(True)
+        self.date_edit_to.setDate(QDate(d.year(), d.month(), 1))
+        ctrl.addWidget(self.date_edit_to)
+        for months in (12, 36):
+            btn = QPushButton(f"{months} мес.")
+            btn.setToolTip(f"{months} месяцев по выбранный месяц включительно")
+            btn.clicked.connect(lambda _checked=False, n=months: self.set_last_months(n))
+            ctrl.addWidget(btn)
         self.btn_gen = QPushButton("Сформировать")
         ctrl.addWidget(self.btn_gen)
         self.btn_export = QPushButton("Экспорт в TXT")
         ctrl.addWidget(self.btn_export)
+        # queries run on a worker thread; switching months quickly only shows the last one
+        self.refresher = PageRefresher(self)
+        self.refresher.finished.connect(self._on_loaded)
+        self.refresher.failed.connect(self._on_load_failed)
+        ctrl.addWidget(busy_label(self.refresher))
         ctrl.addStretch()
         layout.addLayout(ctrl)
 
         self.view = QTableView()
-        self.model = TableModel([], [])
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.view)
+        # money in the user's locale; the TXT export keeps raw values
+        self.model = TableModel([], [], locale=QLocale())
         self.view.setModel(self.model)
         self.view.setAlternatingRowColors(True)
         self.view.horizontalHeader().setStretchLastSection(True)
@@ -62,45 +84,78 @@ class ProfitReportPage(QWidget):
     def loaded(self) -> bool:
         return self._loaded
 
+    def set_last_months(self, months: int) -> None:
+        """Select `months` months ending with the "по" month and build the report."""
+        last = self.date_edit_to.date()
+        self.date_edit.setDate(QDate(last.year(), last.month(), 1).addMonths(1 - months))
+        self.refresh()
+
     def refresh(self) -> None:
-        # compute month start and next month start
+        # first day of the first and of the last month of the range
+        qfrom = self.date_edit.date()
+        qto = self.date_edit_to.date()
+        first = date(qfrom.year(), qfrom.month(), 1)
+        last = date(qto.year(), qto.month(), 1)
+        if last < first:
+            QMessageBox.warning(self, "Период", "Начальный месяц позже конечного")
+            return
+        self.refresher.request(self._query, first, last)
+
+    def _query(self, first: date, last: date) -> list:
+        # worker thread: database only, no widgets
+        # one round trip for the whole range: each table is aggregated per
+        # month on its own, then joined to a calendar so empty months show as 0
+        sql = """
+WITH months AS (
+    SELECT generate_series(%(first)s::date, %(last)s::date, interval '1 month')::date AS month
+),
+s AS (
+    SELECT date_trunc('month', s.sale_date)::date AS month, SUM(s.quantity * s.amount) AS revenue
+    FROM sales s
+    WHERE s.sale_date >= %(first)s AND s.sale_date < %(end)s
+    GROUP BY 1
+),
+c AS (
+    SELECT date_trunc('month', c.charge_date)::date AS month, SUM(c.amount) AS expenses
+    FROM charges c
+    WHERE c.charge_date >= %(first)s AND c.charge_date < %(end)s
+    GROUP BY 1
+)
+SELECT to_char(m.month, 'YYYY-MM'), COALESCE(s.revenue, 0.00), COALESCE(c.expenses, 0.00),
+       COALESCE(s.revenue, 0.00) - COALESCE(c.expenses, 0.00)
+FROM months m
+LEFT JOIN s ON s.month = m.month
+LEFT JOIN c ON c.month = m.month
+ORDER BY m.month
+"""
+        # next month after the last one
+        if last.month == 12:
+            end = date(last.year + 1, 1, 1)
+        else:
+            end = date(last.year, last.month + 1, 1)
+
+        with get_conn(self.cfg) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, {"first": first, "last": last, "end": end})
+                rows = cur.fetchall()
+
+        # keep DB numeric types (Decimal/int) — TableModel will stringify
+        if len(rows) > 1:
+            rows.append(("Итого", sum(r[1] for r in rows), sum(r[2] for r in rows), sum(r[3] for r in rows)))
+        return rows
+
+    def _on_loaded(self, rows: list) -> None:
+        headers = ["Месяц", "Выручка", "Расходы", "Прибыль"]
+        self.model.set_data(headers, rows)
         try:
-            qdate = self.date_edit.date()
-            year = qdate.year()
-            month = qdate.month()
-            start = date(year, month, 1)
-            # next month
-            if month == 12:
-                end = date(year + 1, 1, 1)
-            else:
-                end = date(year, month + 1, 1)
-
-            sql_sales = "SELECT COALESCE(SUM(s.quantity * s.amount),0) FROM sales s WHERE s.sale_date >= %s AND s.sale_date < %s"
-            sql_charges = "SELECT COALESCE(SUM(c.amount),0) FROM charges c WHERE c.charge_date >= %s AND c.charge_date < %s"
-
-            with get_conn(self.cfg) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(sql_sales, (start, end))
-                    total_sales = cur.fetchone()[0]
-                    cur.execute(sql_charges, (start, end))
-                    total_charges = cur.fetchone()[0]
-
-            # keep DB numeric types (Decimal/int) — TableModel will stringify
-            total_sales = total_sales or 0
-            total_charges = total_charges or 0
-            profit = total_sales - total_charges
-            month_str = f"{year:04d}-{month:02d}"
-            rows = [[month_str, total_sales, total_charges, profit]]
-            headers = ["Месяц", "Выручка", "Расходы", "Прибыль"]
-            self.model.set_data(headers, rows)
-            try:
-                self.view.resizeColumnsToContents()
-            except Exception:
-                pass
-            self._loaded = True
-        except Exception as e:
-            self._loaded = False
-            QMessageBox.critical(self, "DB error", str(e))
+            self._sizer.apply()
+        except Exception:
+            pass
+        self._loaded = True
+
+    def _on_load_failed(self, e: Exception) -> None:
+        self._loaded = False
+        QMessageBox.critical(self, "DB error", str(e))
 
     def export_to_txt(self) -> None:
         try:
@@ -112,9 +167,9 @@ class ProfitReportPage(QWidget):
                 return
 
             # Get headers and rows from model (be resilient to storage name)
-            headers = list(getattr(self.model, "_headers", []))
-            data_rows = getattr(self.model, "_rows", None) or getattr(self.model, "_data", None) or []
-            data_rows = list(data_rows)
+            headers = self.model.headers()
+            # raw values, not the locale-formatted display texts
+            data_rows = self.model.rows()
 
             file_path, _ = QFileDialog.getSaveFileName(
                 self,
@@ -11,8 +11,10 @@ from PySide6.QtWidgets import (
     QFileDialog,
     QMessageBox,
 )
-from PySide6.QtCore import Qt, QDate
+from PySide6.QtCore import Qt, QDate, QLocale
 from app.ui.widgets.table_model import TableModel
+from app.ui.widgets.column_widths import ColumnAutoSizer
+from app.ui.widgets.page_refresh import PageRefresher, busy_label
 from app.core.db import get_conn
 from app.core.config import Config
 from PySide6.QtWidgets import QAbstractItemView
@@ -43,11 +45,19 @@ class Top5ReportPage(QWidget):
         ctrl.addWidget(self.btn_gen)
         self.btn_export = QPushButton("Экспорт в TXT")
         ctrl.addWidget(self.btn_export)
+        # queries run on a worker thread; switching months quickly only shows the last one
+        self.refresher = PageRefresher(self)
+        self.refresher.finished.connect(self._on_loaded)
+        self.refresher.failed.connect(self._on_load_failed)
+        ctrl.addWidget(busy_label(self.refresher))
         ctrl.addStretch()
         layout.addLayout(ctrl)
 
         self.view = QTableView()
-        self.model = TableModel([], [])
+        # widths from a sample of rows, remembered for later refreshes
+        self._sizer = ColumnAutoSizer(self.view)
+        # money in the user's locale; the TXT export keeps raw values
+        self.model = TableModel([], [], locale=QLocale())
         self.view.setModel(self.model)
         self.view.setAlternatingRowColors(True)
         self.view.horizontalHeader().setStretchLastSection(True)
@@ -63,17 +73,19 @@ class Top5ReportPage(QWidget):
         return self._loaded
 
     def refresh(self) -> None:
-        try:
-            qdate = self.date_edit.date()
-            year = qdate.year()
-            month = qdate.month()
-            start = date(year, month, 1)
-            if month == 12:
-                end = date(year + 1, 1, 1)
-            else:
-                end = date(year, month + 1, 1)
-
-            sql = """
+        qdate = self.date_edit.date()
+        year = qdate.year()
+        month = qdate.month()
+        start = date(year, month, 1)
+        if month == 12:
+            end = date(year + 1, 1, 1)
+        else:
+            end = date(year, month + 1, 1)
+        self.refresher.request(self._query, start, end)
+
+    def _query(self, start: date, end: date) -> list:
+        # worker thread: database only, no widgets
+        sql = """
 SELECT w.id, w.name, COALESCE(SUM(s.quantity * s.amount),0) AS revenue
 FROM sales s
 JOIN warehouses w ON w.id = s.warehouse_id
@@ -82,22 +94,23 @@ GROUP BY w.id, w.name
 ORDER BY revenue DESC
 LIMIT 5
 """
-            rows = []
-            with get_conn(self.cfg) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(sql, (start, end))
-                    rows = cur.fetchall()
-
-            headers = ["ID", "Товар", "Выручка"]
-            self.model.set_data(headers, rows)
-            try:
-                self.view.resizeColumnsToContents()
-            except Exception:
-                pass
-            self._loaded = True
-        except Exception as e:
-            self._loaded = False
-            QMessageBox.critical(self, "DB error", str(e))
+        with get_conn(self.cfg) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (start, end))
+                return cur.fetchall()
+
+    def _on_loaded(self, rows: list) -> None:
+        headers = ["ID", "Товар", "Выручка"]
+        self.model.set_data(headers, rows)
+        try:
+            self._sizer.apply()
+        except Exception:
+            pass
+        self._loaded = True
+
+    def _on_load_failed(self, e: Exception) -> None:
+        self._loaded = False
+        QMessageBox.critical(self, "DB error", str(e))
 
     def export_to_txt(self) -> None:
         try:
@@ -107,9 +120,9 @@ LIMIT 5
                 QMessageBox.warning(self, "Нет данных", "Нет данных для экспорта")
                 return
 
-            headers = list(getattr(self.model, "_headers", []))
-            data_rows = getattr(self.model, "_rows", None) or getattr(self.model, "_data", None) or []
-            data_rows = list(data_rows)
+            headers = self.model.headers()
+            # raw values, not the locale-formatted display texts
+            data_rows = self.model.rows()
 
             file_path, _ = QFileDialog.getSaveFileName(
                 self,
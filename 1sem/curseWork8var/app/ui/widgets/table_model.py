@@ -1,21 +1,87 @@
-from typing import Sequence, Any
-from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
+from typing import Sequence, Any, Callable
+from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex, QLocale, Signal
+from app.ui.widgets.column_store import CellFormatter, ColumnStore
+from app.ui.widgets.page_refresh import PageRefresher
+
+
+def _load_page(fetch_page: Callable[[Any], Sequence[Sequence[Any]]], after: Any) -> tuple:
+    # worker thread; the callback comes back to tell pages of a replaced query apart
+    return fetch_page, fetch_page(after)
 
 
 class TableModel(QAbstractTableModel):
-    def __init__(self, headers: Sequence[str] | None = None, rows: Sequence[Sequence[Any]] | None = None):
+    """Read-only table model; cell texts are formatted once and cached (see ColumnStore).
+
+    With a `fetch_page` callback the rows are loaded lazily: the view asks for
+    more through `canFetchMore`/`fetchMore` when it scrolls to the bottom, and
+    `fetch_page(last_key)` returns the rows after the first-column value of the
+    last loaded row (see GridPage's paged mode). It runs on a worker thread and
+    the rows are appended when they arrive; no further page is asked for while
+    one is on its way.
+    """
+
+    # exception raised by fetch_page; fetching stops until the next set_data
+    fetch_failed = Signal(object)
+
+    def __init__(self, headers: Sequence[str] | None = None, rows: Sequence[Sequence[Any]] | None = None, locale: QLocale | None = None):
         super().__init__()
         self._headers = list(headers) if headers else []
-        self._rows = list(rows) if rows else []
+        self._formatter = CellFormatter(locale)
+        self._store = ColumnStore(len(self._headers), rows or (), self._formatter)
+        self._fetch_page: Callable[[Any], Sequence[Sequence[Any]]] | None = None
+        self._page_size = 0
+        self._has_more = False
+        self._fetching = False
+        self.pages = PageRefresher(self)
+        self.pages.finished.connect(self._on_page)
+        self.pages.failed.connect(self._on_page_failed)
 
-    def set_data(self, headers: Sequence[str], rows: Sequence[Sequence[Any]]):
+    def set_data(self, headers: Sequence[str], rows: Sequence[Sequence[Any]],
+                 fetch_page: Callable[[Any], Sequence[Sequence[Any]]] | None = None, page_size: int = 0):
+        """Replace all rows; with `fetch_page`, `rows` is the first page of `page_size` rows."""
         self.beginResetModel()
         self._headers = list(headers)
-        self._rows = [list(r) for r in rows]
+        self._store = ColumnStore(len(self._headers), rows, self._formatter)
+        self._fetch_page = fetch_page
+        self._page_size = page_size
+        self._has_more = fetch_page is not None and len(rows) >= page_size
+        # a page still on its way belongs to the old rows and is dropped in _on_page
+        self._fetching = False
         self.endResetModel()
 
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+        return self._has_more and not self._fetching
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        store = self._store
+        if parent.isValid() or not self._has_more or self._fetching or not len(store):
+            return
+        self._fetching = True
+        self.pages.request(_load_page, self._fetch_page, store.value(len(store) - 1, 0))
+
+    def _on_page(self, result: tuple) -> None:
+        fetch_page, rows = result
+        if fetch_page is not self._fetch_page:
+            return
+        self._fetching = False
+        store = self._store
+        self._has_more = len(rows) >= self._page_size
+        if rows:
+            start = len(store)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            store.extend(rows)
+            self.endInsertRows()
+
+    def _on_page_failed(self, e: Exception) -> None:
+        # fetching stops until the next set_data
+        self._fetching = False
+        self._has_more = False
+        self.fetch_failed.emit(e)
+
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
-        return len(self._rows)
+        return len(self._store)
 
     def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return len(self._headers)
@@ -25,12 +91,9 @@ class TableModel(QAbstractTableModel):
             return None
         if role == Qt.DisplayRole:
             try:
-                value = self._rows[index.row()][index.column()]
+                return self._store.text(index.row(), index.column())
             except Exception:
                 return ""
-            if value is None:
-                return ""
-            return str(value)
         return None
 
     def flags(self, index: QModelIndex):
@@ -49,15 +112,23 @@ class TableModel(QAbstractTableModel):
         else:
             return str(section + 1)
 
-    def row_values(self, row: int) -> list[Any] | None:
-        """Return a copy of the values for given row index, or None if OOB."""
-        try:
-            return list(self._rows[row])
-        except Exception:
+    def headers(self) -> list[str]:
+        return list(self._headers)
+
+    def rows(self) -> list[tuple]:
+        """All rows with their raw values (e.g. for export)."""
+        return self._store.rows()
+
+    def row_values(self, row: int) -> tuple | None:
+        """Return the values of given row index as a read-only tuple, or None if OOB."""
+        if not 0 <= row < len(self._store):
             return None
+        return self._store.row(row)
 
     def value_at(self, row: int, col: int) -> Any | None:
         try:
-            return self._rows[row][col]
+            if row < 0 or col < 0:
+                return None
+            return self._store.value(row, col)
         except Exception:
             return None
@@ -59,6 +59,8 @@ def main() -> int:
         if page and hasattr(page, "refresh"):
             try:
                 page.refresh()
+                # refresh() only starts the query; errors are shown by the page
+                page.refresher.wait()
                 print("Profit report refreshed")
             except Exception as e:
                 print("Profit report error:", e, file=sys.stderr)
@@ -69,6 +71,7 @@ def main() -> int:
         if page2 and hasattr(page2, "refresh"):
             try:
                 page2.refresh()
+                page2.refresher.wait()
                 print("Top5 report refreshed")
             except Exception as e:
                 print("Top5 report error:", e, file=sys.stderr)